@@ -1,35 +1,63 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
 import os
-# NEW IMPORT: Import the dotenv function
-from dotenv import load_dotenv
-
-# --- Load the .env file at the start of the script ---
-# Get the parent directory (where app.py is located) to find .env file
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-ENV_PATH = os.path.join(BASE_DIR, '.env')
-
-# Only load if not already loaded (app.py should load it first)
-if 'GOOGLE_API_KEY' not in os.environ:
-    # Try loading .env from multiple locations with BOM handling
-    if os.path.exists(ENV_PATH):
-        try:
-            # Handle BOM (Byte Order Mark) that Windows sometimes adds to UTF-8 files
-            with open(ENV_PATH, 'r', encoding='utf-8-sig') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip().strip('"').strip("'")  # Remove quotes
-                        os.environ[key] = value
-        except Exception:
-            # Fallback to standard load_dotenv
-            load_dotenv(dotenv_path=ENV_PATH, override=True)
-    else:
-        # Try auto-detection
-        load_dotenv()
-# -----------------------------------------------------
+from Backends import backend_spec_for_role, parse_backend_spec, preload_backends
+from Cache import create_cache, make_cache_key
+from Config import load_env
+from AsyncRuntime import run_sync
+from Hedging import create_hedge_policy, hedged
+from LLMPool import async_call_slot, get_async_model, get_prompt_template, rate_limiter, warm_async_models
+from Registry import registry
+from Resilience import AGENT_TIMEOUT_SECONDS, AgentTimeout, Deadline, call_with_retry, is_rate_limited
+from Structured import prompt_templates
+from Telemetry import AGENT_CALL_SECONDS, AGENT_FAILURES, AGENT_IN_FLIGHT, CACHE_LOOKUPS, PROMPT_CHARS, record_usage, span
+
+# .env is loaded once by Config (app.py does it first; this covers scripts importing Agents directly)
+load_env()
+
+# Sampling temperature for every agent; the backend and model are chosen per
+# role (see Utils/Backends.py) and both are part of the cache keys
+MODEL_TEMPERATURE = 0
+
+# Prompt templates for each role, keyed by role name. Roles are defined in
+# specialists.json (see Utils/Registry.py); in structured mode each one also asks
+# for a JSON answer (see Utils/Structured.py). The synthesis placeholders are
+# filled from extra_info at run time, so specialist output containing braces
+# can't break template parsing.
+PROMPT_TEMPLATES = prompt_templates()
+
+# Per-agent output cache; configured via MEDIAGENT_AGENT_CACHE_* (see Utils/Cache.py).
+# Keyed on the rendered prompt, so changing one role's template only re-runs that
+# role plus the synthesis, whose prompt embeds the specialist outputs.
+agent_cache = create_cache("agent", default_max_entries=1024)
+
+# Opt-in duplicate requests for slow specialist calls; configured via MEDIAGENT_HEDGE* (see Utils/Hedging.py)
+hedge_policy = create_hedge_policy()
+
+
+def preload():
+    """
+    Imports the model libraries every role needs and parses every prompt
+    template, without creating clients or starting threads. Safe in a
+    preforking server's master, whose workers then share the result; anything
+    not preloaded is imported on first use instead.
+    """
+    backends = preload_backends(PROMPT_TEMPLATES)
+    for role, template in PROMPT_TEMPLATES.items():
+        get_prompt_template(role, template)
+    return backends
+
+
+def warm_up():
+    """
+    preload(), then creates the pooled model client for every role on the
+    bridge loop so the first request doesn't pay for it. Returns the model
+    specs warmed. Run per process (clients don't survive a fork).
+    """
+    preload()
+    specs = {backend_spec_for_role(role) for role in PROMPT_TEMPLATES}
+    keys = [(*parse_backend_spec(spec), MODEL_TEMPERATURE) for spec in sorted(specs)]
+    run_sync(warm_async_models(keys))
+    return sorted(specs)
 
 class Agent:
     def __init__(self, medical_report=None, role=None, extra_info=None):
@@ -37,8 +65,12 @@ class Agent:
         self.role = role
         self.extra_info = extra_info
         
+        # Backend and model for this role, e.g. "gemini:gemini-2.5-flash" or "ollama:llama3.1"
+        self.model_spec = backend_spec_for_role(role)
+        self.backend, self.model_name = parse_backend_spec(self.model_spec)
+
         # Check that the key was loaded from the .env file
-        if 'GOOGLE_API_KEY' not in os.environ:
+        if self.backend == "gemini" and 'GOOGLE_API_KEY' not in os.environ:
             # Note: The error is more precise here since we tried to load it.
             raise ValueError(
                 "The GOOGLE_API_KEY is not set. Please ensure you have a '.env' file "
@@ -47,91 +79,175 @@ class Agent:
 
         # Initialize the prompt based on role and other info
         self.prompt_template = self.create_prompt_template()
-        
-        # MODEL INITIALIZATION: ChatGoogleGenerativeAI automatically uses 
-        # the GOOGLE_API_KEY environment variable loaded by load_dotenv()
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash", 
-            temperature=0
-        )
+
+        # MODEL INITIALIZATION happens on first call: the shared client for this
+        # backend/model/temperature comes from the process-wide pool (Utils/LLMPool.py);
+        # ChatGoogleGenerativeAI automatically uses the GOOGLE_API_KEY environment variable
+        self.error = None
+        self.error_message = None
+        # Only the parallel specialists are hedged; the synthesis is a single serial call
+        self.hedgeable = role != registry.synthesis_role
 
     def create_prompt_template(self):
-        # ... (Your existing create_prompt_template logic remains the same)
-        if self.role == "MultidisciplinaryTeam":
-            templates = f"""
-                Act like a multidisciplinary team of healthcare professionals.
-                You will receive a medical report of a patient visited by a Cardiologist, Psychologist, and Pulmonologist.
-                Task: Review the patient's medical report from the Cardiologist, Psychologist, and Pulmonologist, analyze them and come up with a list of 3 possible health issues of the patient.
-                Just return a list of bullet points of 3 possible health issues of the patient and for each issue provide the reason.
-                
-                Cardiologist Report: {self.extra_info.get('cardiologist_report', '')}
-                Psychologist Report: {self.extra_info.get('psychologist_report', '')}
-                Pulmonologist Report: {self.extra_info.get('pulmonologist_report', '')}
-            """
-        else:
-            templates = {
-                "Cardiologist": """
-                    Act like a cardiologist. You will receive a medical report of a patient.
-                    Task: Review the patient's cardiac workup, including ECG, blood tests, Holter monitor results, and echocardiogram.
-                    Focus: Determine if there are any subtle signs of cardiac issues that could explain the patient’s symptoms. Rule out any underlying heart conditions, such as arrhythmias or structural abnormalities, that might be missed on routine testing.
-                    Recommendation: Provide guidance on any further cardiac testing or monitoring needed to ensure there are no hidden heart-related concerns. Suggest potential management strategies if a cardiac issue is identified.
-                    Please only return the possible causes of the patient's symptoms and the recommended next steps.
-                    Medical Report: {medical_report}
-                """,
-                "Psychologist": """
-                    Act like a psychologist. You will receive a patient's report.
-                    Task: Review the patient's report and provide a psychological assessment.
-                    Focus: Identify any potential mental health issues, such as anxiety, depression, or trauma, that may be affecting the patient's well-being.
-                    Recommendation: Offer guidance on how to address these mental health concerns, including therapy, counseling, or other interventions.
-                    Please only return the possible mental health issues and the recommended next steps.
-                    Patient's Report: {medical_report}
-                """,
-                "Pulmonologist": """
-                    Act like a pulmonologist. You will receive a patient's report.
-                    Task: Review the patient's report and provide a pulmonary assessment.
-                    Focus: Identify any potential respiratory issues, such as asthma, COPD, or lung infections, that may be affecting the patient's breathing.
-                    Recommendation: Offer guidance on how to address these respiratory concerns, including pulmonary function tests, imaging studies, or other interventions.
-                    Please only return the possible respiratory issues and the recommended next steps.
-                    Patient's Report: {medical_report}
-                """
-            }
-            templates = templates[self.role]
-            
-        return PromptTemplate.from_template(templates)
+        return get_prompt_template(self.role, PROMPT_TEMPLATES[self.role])
     
-    def run(self):
-        print(f"{self.role} is running with Gemini-2.5-flash...")
-        
-        if self.role == "MultidisciplinaryTeam":
-            prompt = self.prompt_template.format(**self.extra_info)
-        else:
-            prompt = self.prompt_template.format(medical_report=self.medical_report)
+    def render_prompt(self):
+        with span("render_prompt", role=self.role) as current:
+            if self.extra_info is not None:
+                prompt = self.prompt_template.format(**self.extra_info)
+            else:
+                prompt = self.prompt_template.format(medical_report=self.medical_report)
+            current.set(prompt_chars=len(prompt))
+        PROMPT_CHARS.observe(len(prompt), role=self.role)
+        return prompt
+
+    def _cache_lookup(self, prompt):
+        """Returns (cache_key, cached_output); the key is None when memoization doesn't apply."""
+        # Outputs are only reproducible at temperature 0, so only memoize then
+        if agent_cache is None or MODEL_TEMPERATURE != 0:
+            return None, None
+        cache_key = make_cache_key(self.role, prompt, self.model_spec, MODEL_TEMPERATURE)
+        cached = agent_cache.get(cache_key)
+        CACHE_LOOKUPS.inc(cache="agent", role=self.role, result="miss" if cached is None else "hit")
+        if cached is not None:
+            print(f"♻️ {self.role} served from cache.")
+        return cache_key, cached
+
+    def _remember(self, cache_key, content):
+        if cache_key is not None and content:
+            agent_cache.set(cache_key, content)
+
+    def run(self, deadline=None):
+        """Blocking wrapper around arun() for callers without an event loop."""
+        return run_sync(self.arun(deadline))
+
+    async def arun(self, deadline=None):
+        """
+        Awaits the model without holding a thread. Retryable failures (429s,
+        timeouts, 5xx) are retried with jittered backoff inside the per-call
+        timeout and the request `deadline`. Returns None on failure, with the
+        reason in self.error ("timeout" or "error") and self.error_message.
+        """
+        print(f"{self.role} is running with {self.model_spec} (async)...")
+        self.error = self.error_message = None
+        with span("agent", role=self.role, model=self.model_spec) as current:
+            content = await self._arun(deadline, current)
+            current.set(outcome=self.error or "ok")
+        AGENT_CALL_SECONDS.observe(current.duration, role=self.role, outcome=self.error or "ok")
+        return content
+
+    async def _arun(self, deadline, current):
+        prompt = self.render_prompt()
 
+        cache_key, cached = self._cache_lookup(prompt)
+        current.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+
+        # Async clients are bound to the loop that created them
+        model = get_async_model(self.backend, self.model_name, MODEL_TEMPERATURE)
+
+        async def invoke():
+            async with async_call_slot(self.role):
+                with span("model_call", role=self.role):
+                    return await model.ainvoke(prompt)
+
+        def attempt():
+            # Each retry attempt may itself be hedged if it runs slow
+            return hedged(self.role, invoke, hedge_policy) if self.hedgeable else invoke()
+
+        AGENT_IN_FLIGHT.inc(role=self.role)
         try:
-            response = self.model.invoke(prompt)
+            response = await call_with_retry(attempt, deadline, rate_limiter)
+            record_usage(self.role, response.usage_metadata)
+            self._remember(cache_key, response.content)
             return response.content
+        except AgentTimeout as e:
+            print(f"⏱ {self.role} cut off: {e}")
+            self.error, self.error_message = "timeout", str(e)
+            AGENT_FAILURES.inc(role=self.role, kind="timeout")
+            return None
         except Exception as e:
-            print(f"Error occurred during Gemini API call for {self.role}: {e}")
+            print(f"Error occurred during model API call for {self.role}: {e}")
+            self.error, self.error_message = "error", str(e)
+            AGENT_FAILURES.inc(role=self.role, kind="error")
             return None
+        finally:
+            AGENT_IN_FLIGHT.dec(role=self.role)
+
+    async def astream(self, deadline=None):
+        """
+        Yields the model's answer in chunks as they are generated. A cached answer
+        is yielded as a single chunk. Yields nothing more if the call fails or the
+        `deadline` passes; the reason is left in self.error like arun().
+        """
+        print(f"{self.role} is streaming with {self.model_spec}...")
+        self.error = self.error_message = None
+        deadline = deadline or Deadline()
+        # The span also covers time the consumer spends between chunks
+        with span("agent_stream", role=self.role, model=self.model_spec) as current:
+            prompt = self.render_prompt()
 
-# Define specialized agent classes (remain the same)
-class Cardiologist(Agent):
-    def __init__(self, medical_report):
-        super().__init__(medical_report, "Cardiologist")
+            cache_key, cached = self._cache_lookup(prompt)
+            current.set(cached=cached is not None)
+            if cached is not None:
+                yield cached
+                return
 
-class Psychologist(Agent):
-    def __init__(self, medical_report):
-        super().__init__(medical_report, "Psychologist")
+            chunks = []
+            usage = {"input_tokens": 0, "output_tokens": 0}
+            AGENT_IN_FLIGHT.inc(role=self.role)
+            try:
+                model = get_async_model(self.backend, self.model_name, MODEL_TEMPERATURE)
+                async with async_call_slot(self.role):
+                    stream = model.astream(prompt).__aiter__()
+                    while True:
+                        # Each chunk must arrive within the per-call timeout and the deadline
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), deadline.timeout_for(AGENT_TIMEOUT_SECONDS))
+                        except StopAsyncIteration:
+                            break
+                        for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                            if key in usage:
+                                usage[key] += value
+                        if chunk.content:
+                            chunks.append(chunk.content)
+                            yield chunk.content
+                rate_limiter.on_success()
+            except asyncio.TimeoutError:
+                print(f"⏱ {self.role} stream cut off")
+                self.error, self.error_message = "timeout", "timed out while streaming"
+                AGENT_FAILURES.inc(role=self.role, kind="timeout")
+                return
+            except Exception as e:
+                if is_rate_limited(e):
+                    rate_limiter.on_throttled()
+                print(f"Error occurred during model API call for {self.role}: {e}")
+                self.error, self.error_message = "error", str(e)
+                AGENT_FAILURES.inc(role=self.role, kind="error")
+                return
+            finally:
+                AGENT_IN_FLIGHT.dec(role=self.role)
+                current.set(outcome=self.error or "ok")
+            record_usage(self.role, usage)
+            self._remember(cache_key, "".join(chunks))
 
-class Pulmonologist(Agent):
-    def __init__(self, medical_report):
-        super().__init__(medical_report, "Pulmonologist")
+class SpecialistAgent(Agent):
+    """Any specialist role from the registry; the role only selects the prompt template."""
+    def __init__(self, role, medical_report):
+        super().__init__(medical_report, role)
 
 class MultidisciplinaryTeam(Agent):
-    def __init__(self, cardiologist_report, psychologist_report, pulmonologist_report):
+    def __init__(self, specialist_reports, not_consulted=()):
+        """
+        specialist_reports: {role: report} for every specialist that was consulted.
+        not_consulted: specialists skipped by triage, named so the team knows they weren't asked.
+        """
+        sections = [f"{role} Report: {report}" for role, report in specialist_reports.items()]
+        if not_consulted:
+            sections.append(f"Not consulted (judged not relevant to this report): {', '.join(not_consulted)}.")
         extra_info = {
-            "cardiologist_report": cardiologist_report,
-            "psychologist_report": psychologist_report,
-            "pulmonologist_report": pulmonologist_report
+            "specialists": ", ".join(specialist_reports),
+            "specialist_reports": "\n\n".join(sections),
         }
-        super().__init__(medical_report=None, role="MultidisciplinaryTeam", extra_info=extra_info)
\ No newline at end of file
+        super().__init__(medical_report=None, role=registry.synthesis_role, extra_info=extra_info)
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import threading
+
+# One long-lived event loop serves every sync caller (Flask views, scripts), so
+# async model clients and their connections are reused instead of being torn
+# down with a fresh asyncio.run() loop on each request.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _forget_loop_after_fork():
+    # Threads don't survive fork(): a child of a process that already started the
+    # bridge loop must start its own rather than submit to a loop nobody runs
+    global _loop, _loop_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_loop_after_fork)
+
+
+def get_bridge_loop():
+    """Returns the background event loop, starting its thread on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="async-bridge", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro, timeout=None):
+    """Runs a coroutine on the bridge loop and blocks the calling thread until it returns."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_bridge_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+
+def iter_sync(agen):
+    """Drives an async generator on the bridge loop, yielding its items to a sync caller."""
+    loop = get_bridge_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        # Iteration finished or the client disconnected: let the generator clean up
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
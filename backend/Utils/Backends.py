@@ -0,0 +1,93 @@
+import importlib
+import os
+
+# Backend used by every role unless overridden, as "<backend>:<model>"
+DEFAULT_BACKEND_SPEC = "gemini:gemini-2.5-flash"
+
+# name -> factory(model_name, temperature) returning a LangChain chat model
+BACKENDS = {}
+# name -> module the factory imports; LangChain and the provider SDKs are only
+# imported on first use (or by preload_backends), which keeps `import app` fast
+BACKEND_MODULES = {}
+
+
+def register_backend(name, module=None):
+    """Decorator that registers a chat-model factory under a backend name."""
+    def decorator(factory):
+        BACKENDS[name] = factory
+        if module:
+            BACKEND_MODULES[name] = module
+        return factory
+    return decorator
+
+
+@register_backend("gemini", module="langchain_google_genai")
+def _gemini(model_name, temperature):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # max_retries=1 disables the SDK's own retries; Resilience.call_with_retry
+    # owns retries so they respect the request deadline and the shared limiter
+    return ChatGoogleGenerativeAI(model=model_name, temperature=temperature, max_retries=1)
+
+
+@register_backend("ollama", module="langchain_ollama")
+def _ollama(model_name, temperature):
+    from langchain_ollama import ChatOllama
+    return ChatOllama(
+        model=model_name,
+        temperature=temperature,
+        base_url=os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434"),
+    )
+
+
+@register_backend("fake", module="FakeBackend")
+def _fake(model_name, temperature):
+    from FakeBackend import FakeChatModel
+    return FakeChatModel(
+        model_name=model_name,
+        latency=os.environ.get("MEDIAGENT_FAKE_LATENCY", "fixed:0"),
+        seed=int(os.environ.get("MEDIAGENT_FAKE_SEED", 0)),
+    )
+
+
+def parse_backend_spec(spec):
+    """Splits "<backend>:<model>" (e.g. "ollama:llama3.1"); the model part may itself contain colons."""
+    backend, _, model_name = spec.partition(":")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}'. Available: {', '.join(sorted(BACKENDS))}")
+    return backend, model_name or backend
+
+
+def backend_spec_for_role(role):
+    """
+    The "<backend>:<model>" a role runs on: MEDIAGENT_LLM_BACKEND_<ROLE> if set
+    (e.g. MEDIAGENT_LLM_BACKEND_PSYCHOLOGIST=ollama:llama3.1), otherwise
+    MEDIAGENT_LLM_BACKEND, otherwise Gemini.
+    """
+    return (
+        os.environ.get(f"MEDIAGENT_LLM_BACKEND_{role.upper()}")
+        or os.environ.get("MEDIAGENT_LLM_BACKEND")
+        or DEFAULT_BACKEND_SPEC
+    )
+
+
+def create_model(backend, model_name, temperature):
+    return BACKENDS[backend](model_name, temperature)
+
+
+def requires_google_api_key(roles):
+    """True if any of the roles runs on Gemini and therefore needs GOOGLE_API_KEY."""
+    return any(parse_backend_spec(backend_spec_for_role(role))[0] == "gemini" for role in roles)
+
+
+def preload_backends(roles):
+    """
+    Imports the library behind every backend the roles use, without creating
+    any client. A preforking server calls this in the master so the workers
+    share the imported modules instead of each importing them on first use.
+    """
+    backends = sorted({parse_backend_spec(backend_spec_for_role(role))[0] for role in roles})
+    for backend in backends:
+        module = BACKEND_MODULES.get(backend)
+        if module:
+            importlib.import_module(module)
+    return backends
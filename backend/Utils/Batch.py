@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import time
+import zipfile
+
+from Cache import make_cache_key, normalize_report
+from Uploads import MAX_UPLOAD_BYTES
+
+REPORT_EXTENSIONS = ('.txt',)
+# Most reports one /process_batch request may analyze at once (its 'concurrency' is clamped to this)
+MAX_BATCH_CONCURRENCY = int(os.environ.get("MEDIAGENT_MAX_BATCH_CONCURRENCY", 8))
+
+
+def _is_report(name):
+    return name.lower().endswith(REPORT_EXTENSIONS) and not os.path.basename(name).startswith('.')
+
+
+def _read_text(data):
+    # Reports are expected to be UTF-8; tolerate a BOM and stray bytes rather than failing the batch
+    return data.decode('utf-8-sig', errors='replace')
+
+
+def _read_limited(f, name):
+    """Reads at most MAX_UPLOAD_BYTES from `f`; a larger report raises ValueError instead of filling memory."""
+    data = f.read(MAX_UPLOAD_BYTES + 1) if MAX_UPLOAD_BYTES else f.read()
+    if MAX_UPLOAD_BYTES and len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"{name} is larger than the limit of {MAX_UPLOAD_BYTES:,} bytes; skipped.")
+    return _read_text(data)
+
+
+def _load_zip_member(zip_path, name):
+    # Its own handle per load: loads run in threads, possibly after iteration has finished
+    with zipfile.ZipFile(zip_path) as archive, archive.open(name) as member:
+        return _read_limited(member, name)
+
+
+def _oversized(name, size):
+    def load():
+        raise ValueError(f"{name} is larger than the limit of {MAX_UPLOAD_BYTES:,} bytes ({size:,} bytes uncompressed); skipped.")
+    return load
+
+
+def iter_zip_reports(zip_path, prefix=""):
+    """
+    Yields (report_id, load) for each report inside a zip archive. Members are
+    only decompressed when `load()` is called, and never past MAX_UPLOAD_BYTES,
+    whatever size the archive claims: a member over the limit fails alone
+    (its record is an error) instead of exhausting memory.
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir() and _is_report(info.filename)]
+    for info in members:
+        report_id = prefix + info.filename
+        if MAX_UPLOAD_BYTES and info.file_size > MAX_UPLOAD_BYTES:
+            yield report_id, _oversized(info.filename, info.file_size)
+        else:
+            yield report_id, (lambda name=info.filename: _load_zip_member(zip_path, name))
+
+
+def iter_reports(paths):
+    """
+    Lazily yields (report_id, load) for every report under the given files,
+    directories and .zip archives. Nothing is read from disk until `load()`
+    is called, so arbitrarily large archives can be streamed.
+    """
+    def load_file(path):
+        with open(path, 'rb') as f:
+            return _read_limited(f, os.path.basename(path))
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full_path = os.path.join(root, name)
+                    if name.lower().endswith('.zip'):
+                        yield from iter_zip_reports(full_path, prefix=os.path.relpath(full_path, path) + "/")
+                    elif _is_report(name):
+                        yield os.path.relpath(full_path, path), (lambda p=full_path: load_file(p))
+        elif path.lower().endswith('.zip'):
+            yield from iter_zip_reports(path, prefix=os.path.basename(path) + "/")
+        elif _is_report(path):
+            yield os.path.basename(path), (lambda p=path: load_file(p))
+
+
+def load_completed(output_path):
+    """Returns the report ids already analyzed successfully in an existing JSONL output file."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a truncated last line; that report is simply redone
+                continue
+            if record.get("status") == "success":
+                completed.add(record.get("report_id"))
+    return completed
+
+
+class JSONLWriter:
+    """Appends one JSON record per line, flushing each so a crash loses at most the line in progress."""
+
+    def __init__(self, path):
+        self.path = path
+        needs_newline = os.path.exists(path) and os.path.getsize(path) > 0 and not self._ends_with_newline(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        if needs_newline:
+            # Terminate a truncated line left by a crash so the next record parses
+            self._file.write("\n")
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def _analyze_one(report_id, load, analyze):
+    started = time.time()
+    record = {"report_id": report_id}
+    try:
+        report = await asyncio.to_thread(load)
+        record["report_hash"] = make_cache_key(normalize_report(report))
+        diagnosis = await analyze(report)
+        if not diagnosis or diagnosis.startswith("Error:"):
+            record.update(status="error", error=diagnosis or "Multidisciplinary synthesis failed.")
+        else:
+            record.update(status="success", diagnosis=diagnosis)
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["elapsed_seconds"] = round(time.time() - started, 3)
+    return record
+
+
+async def analyze_reports(reports, analyze, concurrency=4, skip=()):
+    """
+    Runs `analyze` (an async report -> diagnosis function) over (report_id, load)
+    pairs, keeping at most `concurrency` reports in flight and pulling the next
+    one only when a slot frees up. Yields one result record per report as it
+    finishes. Model calls still go through the process-wide rate budget, so
+    batch and interactive traffic share one limit.
+    """
+    reports = ((report_id, load) for report_id, load in reports if report_id not in skip)
+    pending = set()
+
+    def start_next():
+        for report_id, load in reports:
+            pending.add(asyncio.ensure_future(_analyze_one(report_id, load, analyze)))
+            return True
+        return False
+
+    for _ in range(concurrency):
+        if not start_next():
+            break
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                start_next()
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
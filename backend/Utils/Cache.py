@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Directory for on-disk state (ignored by git)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+
+def normalize_report(text):
+    """Collapses runs of whitespace so re-uploads with different line endings or padding hash the same."""
+    return " ".join((text or "").split())
+
+
+def make_cache_key(*parts):
+    """Builds a stable SHA-256 key from any number of string parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        # Separator so ("ab", "c") and ("a", "bc") don't collide
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache with least-recently-used eviction and an optional TTL.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache backed by SQLite so results survive restarts and are shared between worker processes.
+    Values must be JSON-serializable. Eviction drops the least recently accessed rows past max_entries.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)")
+
+    def _connect(self):
+        # A fresh connection per call keeps this safe across Flask worker threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl_seconds and now - stored_at > self.ttl_seconds:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock, self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResultCache:
+    """
+    Wraps a cache backend and counts hits and misses so we can see how many LLM calls it saves.
+    """
+
+    def __init__(self, backend, name="cache"):
+        self.backend = backend
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "name": self.name,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+def create_cache(name, default_max_entries=256):
+    """
+    Builds a ResultCache from environment variables prefixed with MEDIAGENT_<NAME>_CACHE_:
+      BACKEND      'memory' (default), 'sqlite' or 'none'
+      MAX_ENTRIES  size limit before eviction
+      TTL          seconds before an entry expires (unset = never)
+      PATH         SQLite file (default: data/<name>_cache.sqlite3)
+    Returns None when caching is disabled.
+    """
+    prefix = f"MEDIAGENT_{name.upper()}_CACHE_"
+    backend_name = os.environ.get(prefix + "BACKEND", "memory").lower()
+    max_entries = int(os.environ.get(prefix + "MAX_ENTRIES", default_max_entries))
+    ttl = os.environ.get(prefix + "TTL")
+    ttl_seconds = float(ttl) if ttl else None
+
+    if backend_name == "none":
+        return None
+    if backend_name == "sqlite":
+        path = os.environ.get(prefix + "PATH", os.path.join(DATA_DIR, f"{name}_cache.sqlite3"))
+        backend = SQLiteCache(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+    else:
+        backend = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return ResultCache(backend, name=name)
@@ -0,0 +1,59 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Searched in order; the first .env found is loaded
+ENV_PATHS = (
+    os.path.join(BASE_DIR, ".env"),
+    os.path.join(os.getcwd(), ".env"),
+    os.path.join(os.path.dirname(BASE_DIR), ".env"),
+)
+
+_loaded_from = None
+_loaded = False
+
+
+def parse_env_file(path):
+    """
+    Reads KEY=VALUE lines from a .env file into a dict. Tolerates the BOM that
+    Windows editors add, comments, blank lines, `export ` prefixes and quoted
+    values.
+    """
+    values = {}
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            key = key.strip()
+            if key.startswith("export "):
+                key = key[len("export "):].strip()
+            values[key] = value.strip().strip('"').strip("'")
+    return values
+
+
+def load_env(paths=None, override=False):
+    """
+    Loads the first .env file found into os.environ, once per process. Variables
+    already set in the real environment win unless `override` is set, so a
+    server config or a benchmark can pin settings. Returns the path loaded, or
+    None. Must run before the Utils modules are imported: they read their
+    MEDIAGENT_* settings at import time.
+    """
+    global _loaded, _loaded_from
+    if _loaded and paths is None:
+        return _loaded_from
+    _loaded = True
+    for path in dict.fromkeys(paths or ENV_PATHS):
+        if not os.path.exists(path):
+            continue
+        for key, value in parse_env_file(path).items():
+            if override or key not in os.environ:
+                os.environ[key] = value
+        _loaded_from = path
+        print(f"✓ Loaded .env from: {path}")
+        return path
+    print("⚠ .env file not found. Tried:")
+    for path in dict.fromkeys(paths or ENV_PATHS):
+        print(f"  - {path}")
+    return None
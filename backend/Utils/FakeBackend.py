@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import math
+import random
+import time
+from typing import AsyncIterator, Iterator, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from Structured import JSON_FORMAT_MARKER, fake_answer
+
+
+def _sample_latency(spec, rng):
+    """
+    Draws one latency in seconds from a spec string:
+      fixed:S  uniform:LO,HI  normal:MEAN,SD  lognormal:MEDIAN,SIGMA  exp:MEAN
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        seconds = values[0] if values else 0.0
+    elif kind == "uniform":
+        seconds = rng.uniform(values[0], values[1])
+    elif kind == "normal":
+        seconds = rng.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        seconds = rng.lognormvariate(math.log(values[0]), values[1])
+    elif kind == "exp":
+        seconds = rng.expovariate(1.0 / values[0])
+    else:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    return max(0.0, seconds)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for load testing. The answer is derived from a hash of the
+    prompt, so the same prompt always gets the same answer, and each call
+    sleeps for a latency drawn from `latency` (see _sample_latency).
+    """
+
+    model_name: str = "fake"
+    latency: str = "fixed:0"
+    seed: int = 0
+    _rng: random.Random = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "mediagent-fake"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if JSON_FORMAT_MARKER in prompt:
+            return fake_answer(prompt, digest)
+        return (
+            f"- **Finding {digest[:6]}**: simulated assessment from {self.model_name} "
+            f"(prompt of {len(prompt)} characters).\n"
+            f"- **Finding {digest[6:12]}**: secondary consideration.\n"
+            f"- **Next step**: follow-up testing ({digest[12:18]})."
+        )
+
+    def _message(self, messages, content):
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        usage = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        }
+        return AIMessage(content=content, usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(_sample_latency(self.latency, self._rng))
+        answer = self._answer(messages)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, answer))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(_sample_latency(self.latency, self._rng))
+        answer = self._answer(messages)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, answer))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        lines = self._answer(messages).split("\n")
+        delay = _sample_latency(self.latency, self._rng) / len(lines)
+        for index, line in enumerate(lines):
+            time.sleep(delay)
+            text = line + ("\n" if index < len(lines) - 1 else "")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        lines = self._answer(messages).split("\n")
+        delay = _sample_latency(self.latency, self._rng) / len(lines)
+        for index, line in enumerate(lines):
+            await asyncio.sleep(delay)
+            text = line + ("\n" if index < len(lines) - 1 else "")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
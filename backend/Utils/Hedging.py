@@ -0,0 +1,160 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+
+class LatencyHistogram:
+    """Rolling window of recent call latencies (seconds) for one role."""
+
+    def __init__(self, window=500):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+class HedgePolicy:
+    """
+    Decides when a slow call gets a duplicate ("hedge") and keeps the books.
+
+    A hedge fires once a call has run longer than the `percentile` latency seen
+    for its role, provided at least `min_samples` latencies have been recorded.
+    Hedges are capped at `max_extra_fraction` of primary calls so a slow API
+    can't double our traffic.
+    """
+
+    def __init__(self, enabled=False, percentile=95, min_samples=20, max_extra_fraction=0.1):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_extra_fraction = max_extra_fraction
+        self.histograms = {}
+        self.counters = {"primary_calls": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_over_budget": 0}
+        self._lock = threading.Lock()
+
+    def histogram(self, role):
+        with self._lock:
+            if role not in self.histograms:
+                self.histograms[role] = LatencyHistogram()
+            return self.histograms[role]
+
+    def hedge_delay(self, role):
+        """Seconds to wait before hedging a call for this role, or None to never hedge it."""
+        if not self.enabled:
+            return None
+        histogram = self.histogram(role)
+        if len(histogram) < self.min_samples:
+            return None
+        return histogram.percentile(self.percentile)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _reserve_hedge(self):
+        with self._lock:
+            budget = self.counters["primary_calls"] * self.max_extra_fraction
+            if self.counters["hedges_fired"] + 1 > budget:
+                self.counters["hedges_over_budget"] += 1
+                return False
+            self.counters["hedges_fired"] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            roles = list(self.histograms.items())
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            **counters,
+            "latency_seconds": {
+                role: {"samples": len(h), "p50": h.percentile(50), "p95": h.percentile(95), "p99": h.percentile(99)}
+                for role, h in roles
+            },
+        }
+
+
+async def _timed(call):
+    started = time.monotonic()
+    result = await call()
+    return result, time.monotonic() - started
+
+
+async def hedged(role, call, policy):
+    """
+    Awaits `call()` (a zero-argument coroutine factory). If it hasn't answered
+    within the policy's hedge delay for `role`, a second identical call is
+    started; whichever succeeds first wins and the other is cancelled. If one
+    fails, the other is still given the chance to finish.
+
+    Only the primary's latency goes into the histogram. When the hedge wins,
+    the primary's time so far is recorded as it is cancelled: a lower bound
+    on its latency. Recording the hedge's faster time instead would pull the
+    trigger percentile down with every win, until hedging fed itself.
+    """
+    policy._count("primary_calls")
+    started = time.monotonic()
+    primary = asyncio.ensure_future(_timed(call))
+    tasks = {primary}
+    try:
+        delay = policy.hedge_delay(role)
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and policy._reserve_hedge():
+                print(f"⑂ Hedging {role} after {delay:.2f}s")
+                tasks.add(asyncio.ensure_future(_timed(call)))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            # Primary first, should both have answered in the same instant
+            for task in sorted(done, key=lambda task: task is not primary):
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                result, seconds = task.result()
+                if task is primary:
+                    policy.histogram(role).record(seconds)
+                else:
+                    policy._count("hedges_won")
+                    if not primary.done():
+                        policy.histogram(role).record(time.monotonic() - started)
+                return result
+        raise error
+    finally:
+        # The loser (or both, if we were cancelled) must not keep a call slot busy
+        for task in tasks:
+            task.cancel()
+
+
+def create_hedge_policy():
+    """
+    Builds the hedging policy from environment variables:
+      MEDIAGENT_HEDGING=1                  enable hedged specialist calls (off by default)
+      MEDIAGENT_HEDGE_PERCENTILE           latency percentile that triggers a hedge (default 95)
+      MEDIAGENT_HEDGE_MIN_SAMPLES          latencies needed per role before hedging (default 20)
+      MEDIAGENT_HEDGE_MAX_EXTRA_FRACTION   cap on hedges as a fraction of calls (default 0.1)
+    """
+    return HedgePolicy(
+        enabled=os.environ.get("MEDIAGENT_HEDGING", "0") == "1",
+        percentile=float(os.environ.get("MEDIAGENT_HEDGE_PERCENTILE", 95)),
+        min_samples=int(os.environ.get("MEDIAGENT_HEDGE_MIN_SAMPLES", 20)),
+        max_extra_fraction=float(os.environ.get("MEDIAGENT_HEDGE_MAX_EXTRA_FRACTION", 0.1)),
+    )
@@ -0,0 +1,308 @@
+import hmac
+import json
+import os
+import re
+import sqlite3
+import time
+import uuid
+
+from Backends import backend_spec_for_role
+from Cache import DATA_DIR, make_cache_key, normalize_report
+from Registry import registry
+from Structured import prompt_templates
+
+SUCCEEDED, FAILED = "succeeded", "failed"
+# Largest page the list endpoint returns
+MAX_PAGE_SIZE = 100
+# Origins allowed to read /history* from a browser; the stored reports hold patient names and ids
+HISTORY_CORS_ORIGINS = [origin.strip() for origin in
+                        os.environ.get("MEDIAGENT_HISTORY_CORS_ORIGINS", "http://localhost:3000").split(",")
+                        if origin.strip()]
+# Bearer token every /history* request must carry; with none set, those routes refuse every request
+HISTORY_TOKEN = os.environ.get("MEDIAGENT_HISTORY_TOKEN", "").strip()
+# Expired analyses are deleted at most this often
+_PURGE_INTERVAL = 3600
+
+_NAME = re.compile(r"^\s*(?:patient(?:'s)?\s+)?name\s*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_PATIENT_ID = re.compile(r"^\s*patient\s+id\s*:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+
+
+def patient_details(report):
+    """(name, patient_id) from the report's "Name:" and "Patient ID:" lines; None where missing."""
+    name, patient_id = _NAME.search(report or ""), _PATIENT_ID.search(report or "")
+    return (name.group(1) if name else None), (patient_id.group(1) if patient_id else None)
+
+
+def fingerprint(role):
+    """What an output depends on besides its input: the role's prompt template and model."""
+    template = prompt_templates().get(role, "")
+    return make_cache_key(template)[:16], backend_spec_for_role(role)
+
+
+def _input_hash(text):
+    return make_cache_key(text or "")[:16]
+
+
+class AnalysisHistory:
+    """
+    Every analysis run, kept in SQLite: the report, each consulted specialist's
+    output and the synthesis, indexed by report hash, patient name and time.
+    Each output is stored with the hash of the prompt template, the model and
+    the hash of the input it was produced from, so a re-analysis can tell which
+    outputs are stale and recompute only those. Analyses older than
+    `retention_days` are deleted (0 keeps them until the file is removed).
+    """
+
+    def __init__(self, path, retention_days=30):
+        self.path = path
+        self.retention_days = retention_days
+        self._purged_at = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " id TEXT PRIMARY KEY,"
+                " report_hash TEXT NOT NULL,"
+                " patient_name TEXT COLLATE NOCASE,"
+                " patient_id TEXT,"
+                " report TEXT NOT NULL,"
+                " diagnosis TEXT,"
+                " status TEXT NOT NULL,"
+                " error TEXT,"
+                " triage TEXT,"
+                " consulted TEXT NOT NULL,"
+                " synthesis_template TEXT,"
+                " synthesis_model TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS specialist_outputs ("
+                " analysis_id TEXT NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,"
+                " role TEXT NOT NULL,"
+                " output TEXT,"
+                " error TEXT,"
+                " template_hash TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " input_hash TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (analysis_id, role))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_hash ON analyses(report_hash, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_patient ON analyses(patient_name, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses(created_at)")
+            self._purge(conn, time.time())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _purge(self, conn, now):
+        """Deletes analyses past the retention period (their outputs cascade)."""
+        if not self.retention_days:
+            return
+        self._purged_at = now
+        deleted = conn.execute("DELETE FROM analyses WHERE created_at < ?",
+                               (now - self.retention_days * 86400,)).rowcount
+        if deleted:
+            print(f"🗑 Deleted {deleted} analyses older than {self.retention_days} days from the history")
+
+    def _save_outputs(self, conn, analysis_id, outputs, inputs, now):
+        for role, (output, error) in outputs.items():
+            template_hash, model = fingerprint(role)
+            conn.execute(
+                "INSERT OR REPLACE INTO specialist_outputs"
+                " (analysis_id, role, output, error, template_hash, model, input_hash, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, role, output, error, template_hash, model, _input_hash(inputs.get(role)), now)
+            )
+
+    def record(self, report, outputs, diagnosis, inputs=None, triage=None, error=None):
+        """
+        Stores one analysis and returns its id. `outputs` is {role: (output, error)}
+        for every consulted specialist and `inputs` the report text each was given.
+        """
+        analysis_id, now = uuid.uuid4().hex, time.time()
+        name, patient_id = patient_details(report)
+        template_hash, model = fingerprint(registry.synthesis_role)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO analyses (id, report_hash, patient_name, patient_id, report, diagnosis, status, error,"
+                " triage, consulted, synthesis_template, synthesis_model, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, make_cache_key(normalize_report(report)), name, patient_id, report, diagnosis,
+                 FAILED if error else SUCCEEDED, error, json.dumps(triage) if triage else None,
+                 json.dumps(list(outputs)), template_hash, model, now, now)
+            )
+            self._save_outputs(conn, analysis_id, outputs, inputs or {}, now)
+            if now - self._purged_at >= _PURGE_INTERVAL:
+                self._purge(conn, now)
+        return analysis_id
+
+    def update(self, analysis_id, recomputed, consulted, diagnosis, inputs=None, triage=None, error=None):
+        """
+        Stores a re-analysis: replaces the `recomputed` outputs ({role: (output, error)})
+        and, when `diagnosis` is not None, the synthesis. Outputs of specialists no
+        longer in `consulted` are dropped; the rest are kept as they were.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            self._save_outputs(conn, analysis_id, recomputed, inputs or {}, now)
+            placeholders = ", ".join("?" for _ in consulted)
+            conn.execute(
+                f"DELETE FROM specialist_outputs WHERE analysis_id = ? AND role NOT IN ({placeholders})",
+                (analysis_id, *consulted)
+            )
+            if diagnosis is not None or error is not None:
+                template_hash, model = fingerprint(registry.synthesis_role)
+                conn.execute(
+                    "UPDATE analyses SET diagnosis = COALESCE(?, diagnosis), status = ?, error = ?,"
+                    " synthesis_template = ?, synthesis_model = ? WHERE id = ?",
+                    (diagnosis, FAILED if error else SUCCEEDED, error, template_hash, model, analysis_id)
+                )
+            conn.execute(
+                "UPDATE analyses SET consulted = ?, triage = COALESCE(?, triage), updated_at = ? WHERE id = ?",
+                (json.dumps(list(consulted)), json.dumps(triage) if triage else None, now, analysis_id)
+            )
+
+    def get(self, analysis_id):
+        """The full analysis (report, specialists, diagnosis) as a dict, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+            if row is None:
+                return None
+            outputs = conn.execute(
+                "SELECT role, output, error, template_hash, model, input_hash, updated_at"
+                " FROM specialist_outputs WHERE analysis_id = ?",
+                (analysis_id,)
+            ).fetchall()
+        entry = dict(row)
+        entry["triage"] = json.loads(entry["triage"]) if entry["triage"] else None
+        entry["consulted"] = json.loads(entry["consulted"])
+        order = {role: index for index, role in enumerate(entry["consulted"])}
+        entry["specialists"] = sorted((dict(r) for r in outputs), key=lambda r: order.get(r["role"], len(order)))
+        return entry
+
+    @staticmethod
+    def _where(patient=None, report_hash=None, since=None, until=None):
+        clauses, params = [], []
+        if patient:
+            clauses.append("patient_name LIKE ? ESCAPE '\\'")
+            params.append(re.sub(r"([%_\\])", r"\\\1", patient) + "%")
+        if report_hash:
+            clauses.append("report_hash = ?")
+            params.append(report_hash)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def list(self, page=1, per_page=20, **filters):
+        """
+        One page of analyses, newest first, without report or output text.
+        Filters: `patient` (start of the name, case-insensitive), `report_hash`,
+        and `since` / `until` (epoch seconds).
+        """
+        page, per_page = max(1, page), max(1, min(per_page, MAX_PAGE_SIZE))
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM analyses{where}", params).fetchone()[0]
+            rows = conn.execute(
+                "SELECT id, report_hash, patient_name, patient_id, status, consulted, created_at, updated_at,"
+                f" substr(diagnosis, 1, 200) AS diagnosis_preview FROM analyses{where}"
+                " ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, per_page, (page - 1) * per_page)
+            ).fetchall()
+        items = []
+        for row in rows:
+            item = dict(row)
+            item["consulted"] = json.loads(item["consulted"])
+            items.append(item)
+        return {"items": items, "page": page, "per_page": per_page, "total": total}
+
+    def ids(self, **filters):
+        """Ids of every analysis matching the list() filters, oldest first (for bulk re-analysis)."""
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(f"SELECT id FROM analyses{where} ORDER BY created_at", params)]
+
+    def stats(self):
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM analyses GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (SUCCEEDED, FAILED)}
+
+
+def stale_outputs(entry, inputs):
+    """
+    What a re-analysis of `entry` would recompute, given the report text each
+    currently consulted specialist would now get (`inputs`, {role: text}).
+    Returns ({role: [reasons]}, [synthesis reasons]); reasons are "new",
+    "failed", "template", "model" and "input" for a specialist, and
+    "specialists", "consulted", "template", "model" and "failed" for the synthesis.
+    """
+    stored = {row["role"]: row for row in entry["specialists"]}
+    specialists = {}
+    for role, text in inputs.items():
+        row = stored.get(role)
+        if row is None:
+            specialists[role] = ["new"]
+            continue
+        template_hash, model = fingerprint(role)
+        reasons = []
+        if row["error"] or not row["output"]:
+            reasons.append("failed")
+        if row["template_hash"] != template_hash:
+            reasons.append("template")
+        if row["model"] != model:
+            reasons.append("model")
+        if row["input_hash"] != _input_hash(text):
+            reasons.append("input")
+        if reasons:
+            specialists[role] = reasons
+
+    synthesis = []
+    if specialists:
+        synthesis.append("specialists")
+    if list(inputs) != entry["consulted"]:
+        synthesis.append("consulted")
+    template_hash, model = fingerprint(registry.synthesis_role)
+    if entry["synthesis_template"] != template_hash:
+        synthesis.append("template")
+    if entry["synthesis_model"] != model:
+        synthesis.append("model")
+    if entry["status"] != SUCCEEDED or not entry["diagnosis"]:
+        synthesis.append("failed")
+    return specialists, synthesis
+
+
+def history_authorized(authorization):
+    """True when an Authorization header carries the configured history token."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if not HISTORY_TOKEN or scheme.lower() != "bearer":
+        return False
+    return hmac.compare_digest(token.strip().encode(), HISTORY_TOKEN.encode())
+
+
+def create_history():
+    """
+    Builds the analysis history from environment variables, or returns None when disabled:
+      MEDIAGENT_HISTORY                 1 to keep every analysis, 0 (default) to keep nothing
+      MEDIAGENT_HISTORY_PATH            SQLite file (default: data/history.sqlite3)
+      MEDIAGENT_HISTORY_RETENTION_DAYS  delete analyses older than this (default: 30; 0 keeps them)
+      MEDIAGENT_HISTORY_TOKEN           bearer token required by the /history* routes
+    Reports hold patient data, so keeping them is opt-in.
+    """
+    if os.environ.get("MEDIAGENT_HISTORY", "0") != "1":
+        return None
+    if not HISTORY_TOKEN:
+        print("⚠ MEDIAGENT_HISTORY_TOKEN is not set: analyses are stored but every /history request is refused.")
+    return AnalysisHistory(
+        os.environ.get("MEDIAGENT_HISTORY_PATH", os.path.join(DATA_DIR, "history.sqlite3")),
+        retention_days=float(os.environ.get("MEDIAGENT_HISTORY_RETENTION_DAYS", 30)),
+    )
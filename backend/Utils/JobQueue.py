@@ -0,0 +1,305 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from Cache import DATA_DIR, make_cache_key, normalize_report
+from Telemetry import JOB_QUEUE_WAIT_SECONDS
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+# Owners of the queues started in this process; jobs owned by an earlier process with our pid aren't among them
+_live_owners = set()
+
+
+class JobQueue:
+    """
+    Persistent priority queue of analysis jobs stored in SQLite, consumed by a
+    pool of local worker threads. No external broker is needed, and several
+    processes can share one database file.
+
+    Submitting a report that is already queued or running returns the existing
+    job instead of creating a duplicate. Higher `priority` runs first; ties run
+    in submission order.
+
+    Each running job records the process that claimed it, and that process
+    refreshes the job's heartbeat every `heartbeat_interval` seconds. A job
+    whose process is gone (or that misses heartbeats for `stale_after`
+    seconds) is put back in the queue.
+    """
+
+    def __init__(self, path, analyze, workers=2, stale_after=30, heartbeat_interval=5, poll_interval=1.0):
+        self.path = path
+        self.analyze = analyze
+        self.workers = workers
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+        # host:pid:token; the token tells this process apart from an earlier one that had the same pid
+        self.owner = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " report_hash TEXT NOT NULL,"
+                " report TEXT NOT NULL,"
+                " priority INTEGER NOT NULL DEFAULT 0,"
+                " status TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL)"
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("owner TEXT", "heartbeat_at REAL"):
+                if column.split()[0] not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_next ON jobs(status, priority DESC, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_hash ON jobs(report_hash, status)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- Producer side ---
+
+    def submit(self, report, priority=0):
+        """Queues a report for analysis. Returns (job_id, deduplicated)."""
+        report_hash = make_cache_key(normalize_report(report))
+        self.start()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Never hand back a 'running' job whose worker is gone: requeue those first
+            requeued = self._requeue_orphans(conn)
+            row = conn.execute(
+                "SELECT id, priority FROM jobs WHERE report_hash = ? AND status IN (?, ?)"
+                " ORDER BY created_at LIMIT 1",
+                (report_hash, QUEUED, RUNNING)
+            ).fetchone()
+            if row is not None:
+                # Let a more urgent duplicate pull the existing job forward
+                if priority > row["priority"]:
+                    conn.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, row["id"]))
+                conn.execute("COMMIT")
+                if requeued:
+                    self._notify()
+                return row["id"], True
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, report_hash, report, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, report_hash, report, priority, QUEUED, time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self._notify()
+        return job_id, False
+
+    def get(self, job_id):
+        """Returns the job as a dict (without the report text), or None if unknown."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, priority, status, result, error, created_at, started_at, finished_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job finishes or `timeout` seconds pass. Returns the job dict."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (SUCCEEDED, FAILED):
+                return job
+            interval = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                interval = min(interval, remaining)
+            with self._wakeup:
+                self._wakeup.wait(interval)
+
+    # --- Consumer side ---
+
+    def _notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def start(self):
+        """
+        Starts the worker threads and the heartbeat once per process; safe to
+        call repeatedly. Call it when the server starts so jobs left queued or
+        running by a previous process are picked up without a new submission.
+        """
+        if self._threads and self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._threads and self._started_pid == os.getpid():
+                return
+            # Threads don't survive a fork: a forked worker starts its own
+            self._threads, self._started_pid = [], os.getpid()
+            self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            _live_owners.add(self.owner)
+            with closing(self._connect()) as conn:
+                requeued = self._requeue_orphans(conn)
+            if requeued:
+                print(f"↻ Requeued {requeued} job(s) left running by a stopped process")
+            targets = [(self._work, f"job-worker-{index}") for index in range(self.workers)]
+            targets.append((self._heartbeat, "job-heartbeat"))
+            for target, name in targets:
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            print(f"✓ Started {self.workers} job queue workers ({self.path})")
+
+    def _owner_alive(self, owner):
+        """True/False when `owner` is a process on this host; None when that can't be told."""
+        host, _, rest = (owner or "").partition(":")
+        pid, _, _ = rest.partition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            return None
+        if int(pid) == os.getpid():
+            return owner in _live_owners
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _requeue_orphans(self, conn):
+        """
+        Puts back in the queue every running job whose process has exited or
+        whose heartbeat is older than `stale_after`. Returns how many.
+        """
+        cutoff = time.time() - self.stale_after
+        orphans = [
+            row["id"] for row in conn.execute("SELECT id, owner, heartbeat_at FROM jobs WHERE status = ?", (RUNNING,))
+            if self._owner_alive(row["owner"]) is False or (row["heartbeat_at"] or 0) < cutoff
+        ]
+        for job_id in orphans:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL"
+                " WHERE id = ? AND status = ?",
+                (QUEUED, job_id, RUNNING)
+            )
+        return len(orphans)
+
+    def _heartbeat(self):
+        # Keeps this process's running jobs fresh and recovers jobs from processes that died
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with closing(self._connect()) as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+                        (time.time(), RUNNING, self.owner)
+                    )
+                    conn.execute("BEGIN IMMEDIATE")
+                    requeued = self._requeue_orphans(conn)
+                    conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                print(f"Job queue error during heartbeat: {e}")
+                continue
+            if requeued:
+                print(f"↻ Requeued {requeued} job(s) left running by a stopped process")
+                self._notify()
+
+    def _claim(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, report, created_at FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1",
+                (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, owner = ?, heartbeat_at = ? WHERE id = ?",
+                    (RUNNING, now, self.owner, now, row["id"])
+                )
+            conn.execute("COMMIT")
+            if row is not None:
+                JOB_QUEUE_WAIT_SECONDS.observe(max(0.0, now - row["created_at"]))
+            return (row["id"], row["report"]) if row is not None else None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, result=None, error=None):
+        # Only while this process still owns the job: if it was requeued (stale heartbeat) and
+        # claimed elsewhere, that process's run decides the outcome
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?"
+                " WHERE id = ? AND owner = ? AND status = ?",
+                (FAILED if error else SUCCEEDED, result, error, time.time(), job_id, self.owner, RUNNING)
+            ).rowcount
+        if not updated:
+            print(f"⚠ Job {job_id} was requeued or claimed by another process while running here; result discarded")
+        self._notify()
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(f"Job queue error while claiming a job: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            job_id, report = job
+            print(f"--- Job {job_id} started ---")
+            try:
+                diagnosis = self.analyze(report)
+                if not diagnosis or diagnosis.startswith("Error:"):
+                    self._finish(job_id, error=diagnosis or "Multidisciplinary synthesis failed.")
+                else:
+                    self._finish(job_id, result=diagnosis)
+            except Exception as e:
+                print(f"An error occurred while running job {job_id}: {e}")
+                self._finish(job_id, error=str(e))
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}}
+
+
+def create_job_queue(analyze):
+    """
+    Builds the job queue from environment variables:
+      MEDIAGENT_JOB_WORKERS     worker threads in this process (default 2)
+      MEDIAGENT_JOB_QUEUE_PATH  SQLite file (default: data/jobs.sqlite3)
+    """
+    return JobQueue(
+        os.environ.get("MEDIAGENT_JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.sqlite3")),
+        analyze,
+        workers=int(os.environ.get("MEDIAGENT_JOB_WORKERS", 2)),
+    )
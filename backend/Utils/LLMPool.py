@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+from Backends import create_model
+from RateLimit import RateLimiter
+from Telemetry import CALL_SLOT_WAIT_SECONDS, span
+
+# Upper bound on simultaneous model calls across every agent in this process
+MAX_CONCURRENT_CALLS = int(os.environ.get("MEDIAGENT_MAX_CONCURRENT_CALLS", 8))
+# Process-wide request budget for the model API (0 = unlimited)
+MAX_CALLS_PER_MINUTE = float(os.environ.get("MEDIAGENT_MAX_CALLS_PER_MINUTE", 0))
+
+# Adapts to 429s; starts at MEDIAGENT_THROTTLED_CALLS_PER_MINUTE if no budget is configured
+rate_limiter = RateLimiter(
+    MAX_CALLS_PER_MINUTE,
+    throttled_rate_per_minute=float(os.environ.get("MEDIAGENT_THROTTLED_CALLS_PER_MINUTE", 30))
+)
+
+
+
+class CallSlots:
+    """
+    A process-wide cap on concurrent model calls that coroutines on any event
+    loop can await without polling. Waiters queue in arrival order, and a
+    released slot is handed straight to the oldest one (woken on its own loop),
+    so nobody is starved by newer arrivals.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._free = size
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            # [future, granted]; granted is set under the lock when a slot is handed over
+            waiter = [asyncio.get_running_loop().create_future(), False]
+            self._waiters.append(waiter)
+        try:
+            await waiter[0]
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter[1]:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot arrived as we were cancelled: pass it on
+            self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._free += 1
+                return
+            waiter = self._waiters.popleft()
+            waiter[1] = True
+        future = waiter[0]
+        future.get_loop().call_soon_threadsafe(_grant, future)
+
+    def waiting(self):
+        with self._lock:
+            return len(self._waiters)
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# Per event loop: {(backend, model_name, temperature): model}
+_async_models = weakref.WeakKeyDictionary()
+_templates = {}
+_lock = threading.Lock()
+_call_slots = CallSlots(MAX_CONCURRENT_CALLS)
+_in_flight = 0
+
+
+def get_async_model(backend, model_name, temperature):
+    """
+    Returns the shared chat model for (backend, model_name, temperature) on the running
+    event loop, creating it on first use. Reusing one client keeps its HTTP
+    connections alive between requests. Async HTTP clients can't be shared
+    between loops, so each loop (the sync bridge loop, an ASGI server's loop)
+    gets its own instance.
+    """
+    loop = asyncio.get_running_loop()
+    key = (backend, model_name, temperature)
+    with _lock:
+        models = _async_models.setdefault(loop, {})
+        model = models.get(key)
+        if model is None:
+            model = create_model(backend, model_name, temperature)
+            models[key] = model
+    return model
+
+
+async def warm_async_models(keys):
+    """Creates the shared model for each (backend, model_name, temperature) on the running loop ahead of the first request."""
+    return [get_async_model(*key) for key in keys]
+
+
+def get_prompt_template(role, template):
+    """Returns the compiled PromptTemplate for a role, parsing the template text only once."""
+    key = (role, template)
+    compiled = _templates.get(key)
+    if compiled is None:
+        with _lock:
+            compiled = _templates.get(key)
+            if compiled is None:
+                # Imported here so importing this module doesn't pull in LangChain
+                from langchain_core.prompts import PromptTemplate
+                compiled = PromptTemplate.from_template(template)
+                _templates[key] = compiled
+    return compiled
+
+
+@asynccontextmanager
+async def async_call_slot(role=""):
+    """
+    Waits for the shared rate budget, then for one of the MAX_CONCURRENT_CALLS
+    slots, and holds it for the call. The slots are shared by every event loop
+    in the process and handed out first come, first served. The wait is
+    traced as a "call_slot_wait" span so pool sizing can be judged from data.
+    """
+    global _in_flight
+    with span("call_slot_wait", role=role) as current:
+        await rate_limiter.acquire_async()
+        await _call_slots.acquire()
+    CALL_SLOT_WAIT_SECONDS.observe(current.duration, role=role)
+    with _lock:
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _in_flight -= 1
+        _call_slots.release()
+
+
+def pool_stats():
+    with _lock:
+        return {
+            "models": sum(len(models) for models in _async_models.values()),
+            "templates": len(_templates),
+            "max_concurrent_calls": MAX_CONCURRENT_CALLS,
+            "in_flight": _in_flight,
+            "waiting_for_slot": _call_slots.waiting(),
+            **rate_limiter.stats(),
+        }
@@ -0,0 +1,207 @@
+import os
+import re
+
+from Registry import registry
+from Telemetry import PREPROCESS_TOKENS
+
+# Master switch; set MEDIAGENT_PREPROCESS=0 to send every agent the full raw report again
+PREPROCESS_ENABLED = os.environ.get("MEDIAGENT_PREPROCESS", "1") == "1"
+# Max estimated tokens of report text handed to each specialist (0 = no limit)
+AGENT_TOKEN_BUDGET = int(os.environ.get("MEDIAGENT_AGENT_TOKEN_BUDGET", 1500))
+# Max estimated tokens of each specialist's output handed to the synthesis (0 = no limit)
+SYNTHESIS_TOKEN_BUDGET = int(os.environ.get("MEDIAGENT_SYNTHESIS_TOKEN_BUDGET", 600))
+
+# Header spellings (lowercased, without the colon) mapped to a section name. A
+# line "Header:" opens a section; a line "Header: value" inside another section
+# is split out on its own, so "Medications:" under "Medical History:" becomes
+# the medications section.
+SECTION_ALIASES = {
+    "patient id": "identity",
+    "name": "identity",
+    "patient name": "identity",
+    "date of report": "identity",
+    "chief complaint": "complaint",
+    "presenting complaint": "complaint",
+    "reason for visit": "complaint",
+    "history of present illness": "complaint",
+    "medical history": "history",
+    "personal medical history": "history",
+    "past medical history": "history",
+    "family history": "family",
+    "social history": "lifestyle",
+    "lifestyle factors": "lifestyle",
+    "psychiatric history": "psych",
+    "mental health history": "psych",
+    "psychosocial history": "psych",
+    "medications": "medications",
+    "current medications": "medications",
+    "allergies": "medications",
+    "recent lab and diagnostic results": "labs",
+    "lab results": "labs",
+    "laboratory results": "labs",
+    "diagnostic results": "labs",
+    "investigations": "labs",
+    "physical examination findings": "exam",
+    "physical examination": "exam",
+    "examination": "exam",
+    "vital signs": "vitals",
+    "vitals": "vitals",
+}
+
+# Sections each role needs, from the "sections" of each role in specialists.json;
+# anything before the first header (age, sex) is "demographics", while the
+# patient's name, ID and the report date are "identity", which no shipped role
+# needs. Roles without a list get every section.
+ROLE_SECTIONS = registry.role_sections()
+
+# When a role's text is over budget, sections are dropped in this order (least useful first)
+DROP_ORDER = ("identity", "demographics", "psych", "family", "exam", "lifestyle", "history", "labs",
+              "medications", "vitals", "complaint")
+
+_HEADER = re.compile(r"^\s*([A-Za-z][A-Za-z /&()-]{1,60}?)\s*:\s*(.*)$")
+_TRUNCATED = "[... truncated to fit the token budget]"
+
+
+def estimate_tokens(text):
+    """Rough, deterministic token count (about 4 characters per token for English text)."""
+    return (len(text or "") + 3) // 4
+
+
+def split_sections(report):
+    """
+    Splits a report into an ordered list of (section, [lines]). Lines before the
+    first recognized header are "demographics". Returns [] when no header is
+    recognized, i.e. the report is free text and can't be routed.
+    """
+    sections, current, found = [], "demographics", False
+    for line in report.splitlines():
+        match = _HEADER.match(line)
+        name = SECTION_ALIASES.get(match.group(1).strip().lower()) if match else None
+        if name is not None:
+            found = True
+            if match.group(2):
+                # "Medications: ..." inline: a one-line section, then back to the enclosing one
+                sections.append((name, [line.strip()]))
+                continue
+            current = name
+            sections.append((name, [line.strip()]))
+            continue
+        if not line.strip():
+            continue
+        if not sections or sections[-1][0] != current:
+            sections.append((current, []))
+        sections[-1][1].append(line.strip())
+    return sections if found else []
+
+
+def truncate_to_budget(text, budget):
+    """Cuts `text` at the last line (or failing that, word) boundary within `budget` tokens."""
+    if not budget or estimate_tokens(text) <= budget:
+        return text
+    limit = max(0, budget * 4 - len(_TRUNCATED) - 1)
+    cut = text[:limit]
+    boundary = cut.rfind("\n")
+    if boundary < limit // 2:
+        boundary = cut.rfind(" ")
+    if boundary > 0:
+        cut = cut[:boundary]
+    return cut.rstrip() + "\n" + _TRUNCATED
+
+
+def _render(sections, keep):
+    return "\n".join(line for name, lines in sections if name in keep for line in lines)
+
+
+def report_for_role(sections, role, budget=None):
+    """The report text a role should see: its sections only, shrunk to `budget` tokens."""
+    budget = AGENT_TOKEN_BUDGET if budget is None else budget
+    keep = set(ROLE_SECTIONS.get(role, {name for name, _ in sections}))
+    text = _render(sections, keep)
+    # Over budget: drop whole sections, least useful first, before cutting text mid-section
+    for name in DROP_ORDER:
+        if not budget or estimate_tokens(text) <= budget or len(keep) <= 1:
+            break
+        if name in keep:
+            keep.discard(name)
+            text = _render(sections, keep)
+    return truncate_to_budget(text, budget)
+
+
+class PreparedReport:
+    """
+    One report prepared for fan-out: per-role inputs plus the token counts
+    needed to report what preprocessing saved on this request.
+    """
+
+    def __init__(self, report, roles, budget=None):
+        self.report = report
+        self.sections = split_sections(report) if PREPROCESS_ENABLED else []
+        self.inputs = {}
+        for role in roles:
+            if self.sections:
+                self.inputs[role] = report_for_role(self.sections, role, budget)
+            elif PREPROCESS_ENABLED:
+                # Free-text report: nothing to route, but the budget still applies
+                self.inputs[role] = truncate_to_budget(report, AGENT_TOKEN_BUDGET if budget is None else budget)
+            else:
+                self.inputs[role] = report
+        self.raw_tokens = {role: estimate_tokens(report) for role in roles}
+        self.sent_tokens = {role: estimate_tokens(text) for role, text in self.inputs.items()}
+        self.skipped = []
+
+    @property
+    def roles(self):
+        """Specialists that will be consulted, in order."""
+        return [role for role in self.inputs if role not in self.skipped]
+
+    def for_role(self, role):
+        return self.inputs.get(role, self.report)
+
+    def skip(self, role):
+        """Marks a specialist as not consulted; its whole input counts as saved."""
+        if role not in self.skipped:
+            self.skipped.append(role)
+            self.sent_tokens[role] = 0
+
+    def record_synthesis(self, raw_reports, compact_reports):
+        """Adds the synthesis input (specialist outputs before and after compaction) to the counts."""
+        role = registry.synthesis_role
+        self.raw_tokens[role] = sum(estimate_tokens(text) for text in raw_reports)
+        self.sent_tokens[role] = sum(estimate_tokens(text) for text in compact_reports)
+
+    def savings(self):
+        """Estimated prompt tokens saved on this request, overall and per role; also feeds /metrics."""
+        for role in self.raw_tokens:
+            PREPROCESS_TOKENS.inc(self.raw_tokens[role], role=role, stage="raw")
+            PREPROCESS_TOKENS.inc(self.sent_tokens.get(role, 0), role=role, stage="sent")
+        raw, sent = sum(self.raw_tokens.values()), sum(self.sent_tokens.values())
+        return {
+            "raw_tokens": raw,
+            "sent_tokens": sent,
+            "saved_tokens": raw - sent,
+            "saved_fraction": round((raw - sent) / raw, 4) if raw else 0.0,
+            "per_role": {
+                role: {"raw_tokens": self.raw_tokens[role], "sent_tokens": self.sent_tokens.get(role, 0)}
+                for role in self.raw_tokens
+            },
+        }
+
+
+def compact_specialist_report(text, budget=None):
+    """
+    Deterministically shrinks a specialist's answer before it goes into the
+    synthesis prompt: markdown emphasis and blank lines are dropped, then the
+    text is cut to `budget` tokens at a line boundary, so the leading findings
+    survive and trailing detail goes first.
+    """
+    if not PREPROCESS_ENABLED or not text:
+        return text
+    budget = SYNTHESIS_TOKEN_BUDGET if budget is None else budget
+    lines = [re.sub(r"\*\*|__|^#+\s*", "", line).rstrip() for line in text.splitlines()]
+    compact = "\n".join(line for line in lines if line.strip())
+    return truncate_to_budget(compact, budget)
+
+
+def settings_signature():
+    """Everything here that changes agent inputs, for the whole-analysis cache key."""
+    return f"preprocess={PREPROCESS_ENABLED}:{AGENT_TOKEN_BUDGET}:{SYNTHESIS_TOKEN_BUDGET}:{sorted(ROLE_SECTIONS.items())}"
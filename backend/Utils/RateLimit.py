@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every model call in the process. Callers reserve a
+    token and wait until it is due, so bursts are smoothed to `rate_per_minute`
+    while up to `burst` calls can go out back to back. A rate of 0 disables it.
+
+    The rate adapts to the API: each rate-limit (429) response halves it, and
+    successes grow it back towards the configured ceiling. When no ceiling is
+    configured, the first 429 starts limiting at `throttled_rate_per_minute`,
+    and limiting is lifted again after `recovery_seconds` without a 429.
+    """
+
+    def __init__(self, rate_per_minute=0, burst=None, throttled_rate_per_minute=30,
+                 min_rate_per_minute=1, recovery_seconds=60):
+        self.ceiling = rate_per_minute
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst or max(1, int(rate_per_minute / 60) or 1)
+        self.throttled_rate_per_minute = throttled_rate_per_minute
+        self.min_rate_per_minute = min_rate_per_minute
+        self.recovery_seconds = recovery_seconds
+        self.throttled_count = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._last_throttled = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate_per_minute > 0:
+            rate_per_second = self.rate_per_minute / 60.0
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate_per_second)
+        self._updated = now
+
+    def _reserve(self):
+        """Takes a token (possibly borrowing from the future) and returns how long to wait for it."""
+        with self._lock:
+            if self.rate_per_minute <= 0:
+                return 0.0
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / (self.rate_per_minute / 60.0)
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def on_throttled(self):
+        """Multiplicative decrease after a 429; concurrent 429s from one burst only count once."""
+        with self._lock:
+            now = time.monotonic()
+            self.throttled_count += 1
+            burst_window = 60.0 / self.rate_per_minute if self.rate_per_minute > 0 else 1.0
+            if self._last_throttled is not None and now - self._last_throttled < burst_window:
+                return
+            self._refill(now)
+            current = self.rate_per_minute or self.throttled_rate_per_minute * 2
+            self.rate_per_minute = max(self.min_rate_per_minute, current / 2)
+            # Drop any saved-up burst so the next calls are spaced out immediately
+            self._tokens = min(self._tokens, 0.0)
+            self._last_throttled = now
+            print(f"⚠ Model API rate limited; slowing to {self.rate_per_minute:.1f} calls/min")
+
+    def on_success(self):
+        """Additive increase back towards the ceiling once calls succeed again."""
+        with self._lock:
+            if self._last_throttled is None:
+                return
+            now = time.monotonic()
+            self._refill(now)
+            if self.ceiling <= 0:
+                if now - self._last_throttled >= self.recovery_seconds:
+                    self.rate_per_minute = 0
+                    self._last_throttled = None
+                else:
+                    self.rate_per_minute += 1
+            else:
+                self.rate_per_minute = min(self.ceiling, self.rate_per_minute + max(1.0, self.ceiling * 0.05))
+                if self.rate_per_minute >= self.ceiling:
+                    self._last_throttled = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "configured_calls_per_minute": self.ceiling,
+                "current_calls_per_minute": round(self.rate_per_minute, 2),
+                "throttled_responses": self.throttled_count,
+            }
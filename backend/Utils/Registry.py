@@ -0,0 +1,125 @@
+import json
+import os
+from string import Formatter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Specialist definitions; a .yaml/.yml file works too when PyYAML is installed
+SPECIALISTS_PATH = os.environ.get("MEDIAGENT_SPECIALISTS_PATH", os.path.join(BASE_DIR, "specialists.json"))
+
+
+class Specialist:
+    """One consultable role as defined in the specialists file."""
+
+    def __init__(self, role, prompt, sections=None, keywords=None, enabled=True):
+        self.role = role
+        self.prompt = prompt
+        self.sections = tuple(sections) if sections else None
+        self.keywords = dict(keywords or {})
+        self.enabled = enabled
+
+
+class SpecialistRegistry:
+    """
+    The specialist roles and the synthesis role, loaded once from a JSON or YAML
+    file. Adding a specialty is a new entry in that file; no code changes.
+    """
+
+    def __init__(self, specialists, synthesis_role, synthesis_prompt, path=None):
+        self.specialists = {s.role: s for s in specialists}
+        self.synthesis_role = synthesis_role
+        self.synthesis_prompt = synthesis_prompt
+        self.path = path
+
+    @property
+    def roles(self):
+        """Enabled specialist roles, in file order."""
+        return [role for role, s in self.specialists.items() if s.enabled]
+
+    def prompt_templates(self):
+        """{role: template text} for every enabled specialist plus the synthesis."""
+        templates = {role: self.specialists[role].prompt for role in self.roles}
+        templates[self.synthesis_role] = self.synthesis_prompt
+        return templates
+
+    def role_sections(self):
+        return {role: self.specialists[role].sections for role in self.roles if self.specialists[role].sections}
+
+    def role_keywords(self):
+        return {role: self.specialists[role].keywords for role in self.roles if self.specialists[role].keywords}
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError(f"{path} is YAML but PyYAML is not installed (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _placeholders(path, role, prompt):
+    """
+    The {placeholders} in a prompt, parsed the way the prompt template will
+    parse it. Literal braces (e.g. an example JSON answer) must be doubled.
+    """
+    try:
+        return {name for _, name, _, _ in Formatter().parse(prompt) if name is not None}
+    except ValueError as e:
+        raise ValueError(f"{path}: the prompt for {role} is not a valid template ({e}); write literal braces as {{{{ }}}}")
+
+
+def _check_placeholders(path, role, prompt, expected):
+    found = _placeholders(path, role, prompt)
+    if found != expected:
+        unknown = ", ".join("{" + name + "}" for name in sorted(found - expected))
+        missing = ", ".join("{" + name + "}" for name in sorted(expected - found))
+        problems = [f"unknown placeholders {unknown}" if unknown else "", f"missing {missing}" if missing else ""]
+        raise ValueError(
+            f"{path}: the prompt for {role} must use exactly "
+            f"{', '.join('{' + name + '}' for name in sorted(expected))} "
+            f"({'; '.join(p for p in problems if p)}); write literal braces as {{{{ }}}}"
+        )
+
+
+def load_registry(path=None):
+    """
+    Reads and validates the specialists file:
+      {"specialists": [{"role", "prompt", "sections"?, "keywords"?, "enabled"?}, ...],
+       "synthesis": {"role", "prompt"}}
+    Specialist prompts must use exactly the {medical_report} placeholder and the
+    synthesis prompt exactly {specialists} and {specialist_reports}; any other
+    literal brace must be doubled. Raises ValueError otherwise.
+    """
+    path = path or SPECIALISTS_PATH
+    data = _read(path)
+
+    specialists = []
+    for entry in data.get("specialists", []):
+        role, prompt = entry.get("role"), entry.get("prompt")
+        if not role or not prompt:
+            raise ValueError(f"{path}: every specialist needs a 'role' and a 'prompt'")
+        _check_placeholders(path, role, prompt, {"medical_report"})
+        if any(s.role == role for s in specialists):
+            raise ValueError(f"{path}: duplicate specialist role '{role}'")
+        specialists.append(Specialist(
+            role, prompt,
+            sections=entry.get("sections"),
+            keywords=entry.get("keywords"),
+            enabled=entry.get("enabled", True),
+        ))
+    if not any(s.enabled for s in specialists):
+        raise ValueError(f"{path}: no enabled specialists")
+
+    synthesis = data.get("synthesis") or {}
+    synthesis_role, synthesis_prompt = synthesis.get("role", "MultidisciplinaryTeam"), synthesis.get("prompt")
+    if not synthesis_prompt:
+        raise ValueError(f"{path}: the synthesis entry needs a 'prompt'")
+    _check_placeholders(path, synthesis_role, synthesis_prompt, {"specialists", "specialist_reports"})
+
+    return SpecialistRegistry(specialists, synthesis_role, synthesis_prompt, path)
+
+
+# Loaded once per process; every module reads roles, prompts, sections and keywords from here
+registry = load_registry()
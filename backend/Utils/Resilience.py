@@ -0,0 +1,121 @@
+import asyncio
+import os
+import random
+import time
+
+# Budget for one whole analysis (specialists + synthesis), in seconds
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("MEDIAGENT_REQUEST_DEADLINE_SECONDS", 180))
+# Part of that budget held back for the synthesis; specialists are cut off before it
+SYNTHESIS_RESERVE_SECONDS = float(os.environ.get("MEDIAGENT_SYNTHESIS_RESERVE_SECONDS", 45))
+# Per-call limit for a single model request, in seconds
+AGENT_TIMEOUT_SECONDS = float(os.environ.get("MEDIAGENT_AGENT_TIMEOUT_SECONDS", 60))
+# Attempts per agent call, including the first one
+AGENT_MAX_ATTEMPTS = int(os.environ.get("MEDIAGENT_AGENT_MAX_ATTEMPTS", 3))
+# Backoff before retry n is drawn uniformly from [0, min(cap, base * 2**n)] ("full jitter")
+RETRY_BASE_SECONDS = float(os.environ.get("MEDIAGENT_RETRY_BASE_SECONDS", 1.0))
+RETRY_CAP_SECONDS = float(os.environ.get("MEDIAGENT_RETRY_CAP_SECONDS", 20.0))
+
+
+class AgentTimeout(Exception):
+    """Raised when an agent call runs past its per-call timeout or the request deadline."""
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request must be finished. Created once
+    per request and handed to every agent so retries and slow calls can't
+    overrun the overall budget. A Deadline of None seconds never expires.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def reserve(self, seconds):
+        """Returns a Deadline ending `seconds` earlier, keeping that time back for a later stage."""
+        child = Deadline()
+        if self.expires_at is not None:
+            child.seconds = self.seconds
+            child.expires_at = max(time.monotonic(), self.expires_at - seconds)
+        return child
+
+    def timeout_for(self, per_call_timeout):
+        """Timeout for the next call: the per-call limit, capped by what's left of the deadline."""
+        remaining = self.remaining()
+        if remaining is None:
+            return per_call_timeout
+        return min(per_call_timeout, remaining) if per_call_timeout else remaining
+
+
+def is_rate_limited(exc):
+    """True for quota / 429 errors, however deeply the client library wrapped them."""
+    while exc is not None:
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        if code == 429 or "429" in str(exc) or "RESOURCE_EXHAUSTED" in str(exc):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def is_retryable(exc):
+    """Rate limits, timeouts, dropped connections and 5xx responses are worth another attempt."""
+    if is_rate_limited(exc) or isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    while exc is not None:
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        if isinstance(code, int) and 500 <= code < 600:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(RETRY_CAP_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+async def call_with_retry(call, deadline=None, rate_limiter=None, timeout=None, max_attempts=None):
+    """
+    Awaits `call()` (a zero-argument coroutine factory) with a per-attempt
+    timeout and jittered exponential backoff between retryable failures.
+    Rate-limit errors slow the shared limiter down; successes let it recover.
+    Raises AgentTimeout once the deadline leaves no room for another attempt.
+    """
+    deadline = deadline or Deadline()
+    timeout = AGENT_TIMEOUT_SECONDS if timeout is None else timeout
+    max_attempts = max_attempts or AGENT_MAX_ATTEMPTS
+
+    for attempt in range(max_attempts):
+        attempt_timeout = deadline.timeout_for(timeout)
+        if attempt_timeout is not None and attempt_timeout <= 0:
+            raise AgentTimeout("request deadline exceeded")
+        try:
+            result = await asyncio.wait_for(call(), attempt_timeout)
+        except asyncio.TimeoutError:
+            if deadline.expired() or attempt == max_attempts - 1:
+                raise AgentTimeout(f"timed out after {attempt_timeout:.1f}s")
+            error = None
+        except Exception as e:
+            if is_rate_limited(e) and rate_limiter is not None:
+                rate_limiter.on_throttled()
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                raise
+            error = e
+        else:
+            if rate_limiter is not None:
+                rate_limiter.on_success()
+            return result
+
+        delay = backoff_delay(attempt)
+        remaining = deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            raise AgentTimeout("request deadline exceeded") from error
+        print(f"↻ Retrying in {delay:.1f}s (attempt {attempt + 2}/{max_attempts}): {error or 'timeout'}")
+        await asyncio.sleep(delay)
@@ -0,0 +1,143 @@
+import json
+import os
+import re
+from typing import List
+
+from Registry import registry
+from Telemetry import STRUCTURED_OUTPUTS
+
+# Set MEDIAGENT_STRUCTURED_OUTPUT=1 to have every agent answer in JSON (see assessment_schema)
+STRUCTURED_OUTPUT = os.environ.get("MEDIAGENT_STRUCTURED_OUTPUT", "0") == "1"
+
+# Starts the format instructions appended to each prompt; the fake backend looks for it
+JSON_FORMAT_MARKER = "Output format: JSON"
+
+# Braces are doubled: these are appended to PromptTemplate f-strings
+SPECIALIST_FORMAT = (
+    "\n" + JSON_FORMAT_MARKER + ". Return only a JSON object, with no prose or markdown around it:\n"
+    '{{"findings": [{{"condition": "...", "likelihood": "high|moderate|low", "evidence": "..."}}], '
+    '"next_steps": ["..."]}}\n'
+    "List at most 5 findings, most likely first. Keep each evidence to one short sentence "
+    "and each next step to a few words.\n"
+)
+SYNTHESIS_FORMAT = (
+    "\n" + JSON_FORMAT_MARKER + ". Return only a JSON object, with no prose or markdown around it:\n"
+    '{{"findings": [{{"condition": "...", "likelihood": "high|moderate|low", "evidence": "...", '
+    '"specialists": ["..."]}}], "next_steps": ["..."]}}\n'
+    "Give exactly 3 findings, most likely first. The evidence is the reason for each issue; "
+    "specialists names the specialists whose reports support it.\n"
+)
+
+_LIKELIHOODS = {"high": "high", "likely": "high", "moderate": "moderate", "medium": "moderate",
+                "possible": "moderate", "low": "low", "unlikely": "low"}
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_schema = None
+
+
+def assessment_schema():
+    """
+    The pydantic model every agent's answer must match in structured mode:
+    ranked findings and next steps. Built on first use, so importing this
+    module (and so the app) doesn't pull in pydantic.
+    """
+    global _schema
+    if _schema is not None:
+        return _schema
+    from pydantic import BaseModel, Field, field_validator
+
+    class Finding(BaseModel):
+        condition: str = Field(min_length=1, max_length=200)
+        likelihood: str
+        evidence: str = Field(default="", max_length=1000)
+        specialists: List[str] = Field(default_factory=list)
+
+        @field_validator("likelihood", mode="before")
+        @classmethod
+        def _normalize_likelihood(cls, value):
+            likelihood = _LIKELIHOODS.get(str(value).strip().lower())
+            if likelihood is None:
+                raise ValueError(f"likelihood must be high, moderate or low, not {value!r}")
+            return likelihood
+
+    class Assessment(BaseModel):
+        findings: List[Finding] = Field(min_length=1, max_length=10)
+        next_steps: List[str] = Field(default_factory=list, max_length=10)
+
+    _schema = Assessment
+    return _schema
+
+
+def prompt_templates():
+    """
+    {role: template text} for every agent: the registry's templates, plus the
+    JSON format instructions when structured mode is on.
+    """
+    templates = registry.prompt_templates()
+    if not STRUCTURED_OUTPUT:
+        return templates
+    return {
+        role: template + (SYNTHESIS_FORMAT if role == registry.synthesis_role else SPECIALIST_FORMAT)
+        for role, template in templates.items()
+    }
+
+
+def parse_assessment(text):
+    """
+    The assessment (see assessment_schema) in an agent's answer, or None if it
+    isn't valid JSON of that shape. Tolerates a ```json fence and text around
+    the object.
+    """
+    if not text or "{" not in text:
+        return None
+    text = _FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    from pydantic import ValidationError
+    try:
+        return assessment_schema().model_validate_json(text[start:end + 1])
+    except ValidationError:
+        return None
+
+
+def validate_output(role, text):
+    """parse_assessment() for a fresh agent answer in structured mode; counts and logs the outcome."""
+    assessment = parse_assessment(text)
+    if text:
+        STRUCTURED_OUTPUTS.inc(role=role, outcome="valid" if assessment else "invalid")
+        if assessment is None:
+            print(f"⚠ {role} did not return a valid structured answer; using its text as is.")
+    return assessment
+
+
+def to_dict(text):
+    """The parsed assessment in `text` as a JSON-ready dict, or None."""
+    assessment = parse_assessment(text)
+    return assessment.model_dump() if assessment else None
+
+
+def compact_assessment(assessment) -> str:
+    """
+    One line per finding plus one for the next steps: what the synthesis
+    prompt gets instead of a specialist's full answer.
+    """
+    lines = []
+    for finding in assessment.findings:
+        line = f"- {finding.condition} ({finding.likelihood})"
+        if finding.evidence:
+            line += f": {finding.evidence}"
+        lines.append(line)
+    if assessment.next_steps:
+        lines.append("Next: " + "; ".join(assessment.next_steps))
+    return "\n".join(lines)
+
+
+def fake_answer(prompt, digest):
+    """A valid assessment as JSON for the offline fake backend, derived from the prompt's hash."""
+    return json.dumps({
+        "findings": [
+            {"condition": f"Finding {digest[:6]}", "likelihood": "high",
+             "evidence": f"simulated assessment (prompt of {len(prompt)} characters)"},
+            {"condition": f"Finding {digest[6:12]}", "likelihood": "moderate", "evidence": "secondary consideration"},
+            {"condition": f"Finding {digest[12:18]}", "likelihood": "low", "evidence": "less likely"},
+        ],
+        "next_steps": [f"follow-up testing ({digest[18:24]})"],
+    })
@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from Cache import DATA_DIR
+
+# Upper bounds (seconds) of the latency histogram buckets; model calls take seconds, not milliseconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+# Upper bounds of the prompt-size histogram buckets, in characters
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_sample(self, key, state):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', bound)])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {round(state['sum'], 6)}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics rendered in the Prometheus text format. Values
+    owned by other modules (pool, cache and queue stats) are pulled in at
+    render time through collectors rather than being mirrored on every change.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collect):
+        """Registers a callable returning [(name, help, {labels}, value), ...], called on every render."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"⚠ Metrics collector failed: {e}")
+                continue
+            described = set()
+            for name, help_text, labels, value in samples:
+                if value is None:
+                    continue
+                if name not in described:
+                    lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "mediagent_span_seconds", "Duration of each pipeline stage.", ("span", "role"))
+AGENT_CALL_SECONDS = metrics.histogram(
+    "mediagent_agent_call_seconds", "Agent call latency including retries, by outcome.", ("role", "outcome"))
+AGENT_IN_FLIGHT = metrics.gauge(
+    "mediagent_agent_calls_in_flight", "Agent calls currently running.", ("role",))
+AGENT_FAILURES = metrics.counter(
+    "mediagent_agent_failures_total", "Agent calls that gave up, by kind (timeout or error).", ("role", "kind"))
+CALL_SLOT_WAIT_SECONDS = metrics.histogram(
+    "mediagent_call_slot_wait_seconds", "Time spent waiting for the rate limiter and a model call slot.", ("role",))
+PROMPT_CHARS = metrics.histogram(
+    "mediagent_prompt_chars", "Size of rendered prompts in characters.", ("role",), buckets=SIZE_BUCKETS)
+TOKENS = metrics.counter(
+    "mediagent_tokens_total", "Model tokens reported by the backend.", ("role", "direction"))
+CACHE_LOOKUPS = metrics.counter(
+    "mediagent_cache_lookups_total", "Result cache lookups by cache, role and result (hit or miss).", ("cache", "role", "result"))
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "mediagent_http_request_seconds", "HTTP request latency by endpoint and status.", ("endpoint", "method", "status"))
+HTTP_IN_FLIGHT = metrics.gauge(
+    "mediagent_http_requests_in_flight", "HTTP requests currently being handled.", ("endpoint",))
+PREPROCESS_TOKENS = metrics.counter(
+    "mediagent_preprocess_tokens_total", "Estimated report tokens per role before (raw) and after (sent) preprocessing.", ("role", "stage"))
+TRIAGE_DECISIONS = metrics.counter(
+    "mediagent_triage_decisions_total", "Triage decisions per specialist (run, skip, or would_skip in dry-run mode).", ("role", "decision"))
+UPLOADS = metrics.counter(
+    "mediagent_uploads_total", "Report uploads by kind (text, pdf, docx) and outcome (ok or the HTTP error status).", ("kind", "outcome"))
+STRUCTURED_OUTPUTS = metrics.counter(
+    "mediagent_structured_outputs_total", "Agent answers in structured mode by whether they validated (valid or invalid).", ("role", "outcome"))
+JOB_QUEUE_WAIT_SECONDS = metrics.histogram(
+    "mediagent_job_queue_wait_seconds", "Time jobs spent queued before a worker claimed them.")
+
+
+# --- Tracing ---
+
+# Set MEDIAGENT_TRACE=1 to append every finished span as a JSON line to MEDIAGENT_TRACE_PATH
+TRACE_ENABLED = os.environ.get("MEDIAGENT_TRACE", "0") == "1"
+TRACE_PATH = os.environ.get("MEDIAGENT_TRACE_PATH", os.path.join(DATA_DIR, "traces.jsonl"))
+
+_current_span = ContextVar("mediagent_span", default=None)
+_trace_lock = threading.Lock()
+
+
+class Span:
+    """One timed stage of a request. Attributes added with set() are exported with it."""
+
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+        }
+
+
+def _export(span):
+    if not TRACE_ENABLED:
+        return
+    try:
+        with _trace_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(TRACE_PATH)), exist_ok=True)
+            with open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+    except OSError as e:
+        print(f"⚠ Could not write trace span: {e}")
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a stage of the pipeline as a child of the current span (spans nest
+    across awaits and into tasks started inside them). The duration feeds the
+    mediagent_span_seconds histogram; with MEDIAGENT_TRACE=1 the span is also
+    written out as JSON. An exception is recorded on the span and re-raised.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, **attributes)
+    _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._started
+        # set() rather than reset(): async generators driven from sync code may
+        # finish the span in a different context than the one that opened it
+        _current_span.set(parent)
+        SPAN_SECONDS.observe(current.duration, span=name, role=current.attributes.get("role", ""))
+        _export(current)
+
+
+def record_usage(role, usage):
+    """Adds a model response's token counts (LangChain usage_metadata) to the current span and the counters."""
+    usage = usage or {}
+    input_tokens, output_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    if input_tokens:
+        TOKENS.inc(input_tokens, role=role, direction="input")
+    if output_tokens:
+        TOKENS.inc(output_tokens, role=role, direction="output")
+    current = _current_span.get()
+    if current is not None and usage:
+        current.set(input_tokens=input_tokens, output_tokens=output_tokens)
+    return usage
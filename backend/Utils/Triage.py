@@ -0,0 +1,132 @@
+import os
+import re
+
+from Registry import registry
+from Telemetry import TRIAGE_DECISIONS
+
+MODES = ("off", "dry_run", "on")
+
+
+def _check_mode(mode):
+    mode = mode.strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown triage mode {mode!r}: MEDIAGENT_TRIAGE must be one of {', '.join(MODES)}")
+    return mode
+
+
+# 'off' runs every specialist; 'dry_run' (default) scores and logs what would be
+# skipped but still runs everyone; 'on' only runs specialists above the threshold
+TRIAGE_MODE = _check_mode(os.environ.get("MEDIAGENT_TRIAGE", "dry_run"))
+# Relevance (0-1) a specialist needs to be consulted when triage is on
+TRIAGE_THRESHOLD = float(os.environ.get("MEDIAGENT_TRIAGE_THRESHOLD", 0.3))
+# Summed keyword weight at which a specialty counts as fully relevant (score 1.0)
+SATURATION = 3.0
+
+# Per specialty, terms (regex, matched case-insensitively at a word start) and
+# their weight, from the "keywords" of each role in specialists.json. Weight 1
+# terms are specific to the specialty; 0.5 terms are shared symptoms or weak hints.
+KEYWORDS = registry.role_keywords()
+
+# A term preceded by one of these in the same clause is a pertinent negative
+# ("no wheezing", "normal heart sounds") and doesn't count; nor does "non-smoker"
+_NEGATION = re.compile(r"\b(no|not|denies|without|negative for|normal|clear|unremarkable|non-contributory)\b", re.IGNORECASE)
+_CLAUSE = re.compile(r"[.;\n]|,\s+(?:but|and)\s+")
+_COMPILED = {
+    role: [(re.compile(r"\b" + pattern, re.IGNORECASE), weight) for pattern, weight in terms.items()]
+    for role, terms in KEYWORDS.items()
+}
+
+
+def score_report(report, roles):
+    """
+    Relevance of each specialty to the report in [0, 1], from the specialty's
+    keywords that appear without a negation earlier in the same clause. Each
+    term counts once; family-history mentions count half.
+    """
+    clauses = []
+    for line in report.splitlines():
+        family = line.strip().lower().startswith("family history")
+        clauses.extend((clause, 0.5 if family else 1.0) for clause in _CLAUSE.split(line) if clause.strip())
+
+    scores, matches = {}, {}
+    for role in roles:
+        found = {}
+        for pattern, weight in _COMPILED.get(role, ()):
+            for clause, factor in clauses:
+                match = pattern.search(clause)
+                if match is None:
+                    continue
+                before = clause[:match.start()]
+                if not _NEGATION.search(before) and not before.lower().endswith("non-"):
+                    found[pattern.pattern] = max(found.get(pattern.pattern, 0), weight * factor)
+        scores[role] = round(min(1.0, sum(found.values()) / SATURATION), 3)
+        matches[role] = sorted(p.replace(r"\b", "") for p in found)
+    return scores, matches
+
+
+class TriageDecision:
+    """
+    Which specialists to run for one report, and why. `would_skip` is what the
+    scores alone rule out; it only equals `skipped` when triage is on.
+    """
+
+    def __init__(self, mode, scores, matches, selected, skipped, would_skip=()):
+        self.mode = mode
+        self.scores = scores
+        self.matches = matches
+        self.selected = selected
+        self.skipped = skipped
+        self.would_skip = list(would_skip)
+
+    def to_dict(self):
+        return {
+            "mode": self.mode,
+            "threshold": TRIAGE_THRESHOLD,
+            "scores": self.scores,
+            "selected": self.selected,
+            "skipped": self.skipped,
+            "would_skip": self.would_skip,
+        }
+
+
+def triage(report, roles, mode=None, threshold=None):
+    """
+    Scores every specialty and picks the ones to consult. Specialties without
+    keywords are always consulted. If nothing matches at all, everyone runs (no
+    evidence either way); if something matches but nothing clears the
+    threshold, the best-scoring specialists run so the synthesis has an input.
+    In dry-run mode the decision is logged but everyone still runs.
+    """
+    mode = _check_mode(mode) if mode else TRIAGE_MODE
+    threshold = TRIAGE_THRESHOLD if threshold is None else threshold
+    roles = list(roles)
+    if mode == "off":
+        return TriageDecision(mode, {}, {}, roles, [])
+
+    scores, matches = score_report(report, roles)
+    wanted = [role for role in roles if role not in KEYWORDS or scores[role] >= threshold]
+    if not wanted:
+        best = max(scores.values())
+        wanted = [role for role in roles if scores[role] == best] if best > 0 else roles
+    would_skip = [role for role in roles if role not in wanted]
+
+    summary = ", ".join(f"{role} {scores[role]:.2f}" for role in roles)
+    if mode == "dry_run":
+        if would_skip:
+            print(f"⚖ Triage (dry run) would skip {', '.join(would_skip)} ({summary})")
+        for role in roles:
+            TRIAGE_DECISIONS.inc(role=role, decision="would_skip" if role in would_skip else "run")
+        return TriageDecision(mode, scores, matches, roles, [], would_skip)
+
+    print(f"⚖ Triage: consulting {', '.join(wanted)}" + (f", skipping {', '.join(would_skip)}" if would_skip else "") + f" ({summary})")
+    for role in roles:
+        TRIAGE_DECISIONS.inc(role=role, decision="skip" if role in would_skip else "run")
+    return TriageDecision(mode, scores, matches, wanted, would_skip, would_skip)
+
+
+def settings_signature():
+    """Triage settings that change which specialists run, for the whole-analysis cache key."""
+    # off and dry_run both run everyone; TRIAGE_MODE is already one of MODES
+    if TRIAGE_MODE != "on":
+        return "triage=off"
+    return f"triage=on:{TRIAGE_THRESHOLD}:{sorted((role, sorted(terms.items())) for role, terms in KEYWORDS.items())}"
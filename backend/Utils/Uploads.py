@@ -0,0 +1,348 @@
+import codecs
+import importlib.util
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from Telemetry import UPLOADS, span
+
+# Largest accepted upload in bytes; bigger requests are refused with 413 before being read
+MAX_UPLOAD_BYTES = int(os.environ.get("MEDIAGENT_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+# Largest /process_batch request in bytes (all files together); each report in it is still held to MAX_UPLOAD_BYTES
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get("MEDIAGENT_MAX_BATCH_UPLOAD_BYTES", 100 * 1024 * 1024))
+# Largest report (in characters, after decoding or extraction) handed to the pipeline
+MAX_REPORT_CHARS = int(os.environ.get("MEDIAGENT_MAX_REPORT_CHARS", 200_000))
+# Most PDF/DOCX extractions running at once, each in its own process
+EXTRACT_WORKERS = int(os.environ.get("MEDIAGENT_EXTRACT_WORKERS", 2))
+# How long one document may take to extract before its process is killed and the upload rejected
+EXTRACT_TIMEOUT_SECONDS = float(os.environ.get("MEDIAGENT_EXTRACT_TIMEOUT_SECONDS", 30))
+# Encoding for text that is neither UTF-8 nor detectable (undecodable bytes become U+FFFD)
+FALLBACK_ENCODING = os.environ.get("MEDIAGENT_UPLOAD_FALLBACK_ENCODING", "cp1252")
+# Mess ratio (charset_normalizer) above which a decode counts as garbled
+_MAX_MESS = 0.2
+
+CHUNK_SIZE = 64 * 1024
+TEXT_EXTENSIONS = (".txt",)
+DOCUMENT_EXTENSIONS = (".pdf", ".docx")
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + DOCUMENT_EXTENSIONS
+# Room for the multipart boundaries and headers around the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+# Longest BOMs first, so UTF-32 LE isn't mistaken for UTF-16 LE
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+_context = None
+_context_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, EXTRACT_WORKERS))
+
+
+def _reset_after_fork():
+    # A forked web worker starts with its own extraction slots
+    global _context_lock, _slots
+    _context_lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(max(1, EXTRACT_WORKERS))
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class UploadError(Exception):
+    """An upload that can't be turned into a report; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_size_limit():
+    """Byte limit for a whole upload request (set on flask.request before touching request.files)."""
+    return MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD if MAX_UPLOAD_BYTES else None
+
+
+def batch_size_limit():
+    """Byte limit for a whole /process_batch request."""
+    return MAX_BATCH_UPLOAD_BYTES + _MULTIPART_OVERHEAD if MAX_BATCH_UPLOAD_BYTES else None
+
+
+def upload_kind(filename):
+    """'text', 'pdf' or 'docx' from the file extension; UploadError (415) for anything else."""
+    name = (filename or "").lower()
+    if name.endswith(TEXT_EXTENSIONS):
+        return "text"
+    if name.endswith(DOCUMENT_EXTENSIONS):
+        return name.rsplit(".", 1)[1]
+    raise UploadError(f"Invalid file type. Only {', '.join(SUPPORTED_EXTENSIONS)} files are accepted for analysis.", 415)
+
+
+def _too_large(what, limit):
+    return UploadError(f"Upload too large: the {what} exceeds the limit of {limit:,}.", 413)
+
+
+def _sniff_encoding(head):
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def _detect_encoding(sample):
+    """
+    Encoding for non-UTF-8 text. FALLBACK_ENCODING wins whenever it decodes the
+    sample into clean text: on short, mostly-ASCII reports charset_normalizer
+    often picks a wrong code page (cp1252 read as cp775 turns "José" into
+    "Josķ"). Its guess is used only when the fallback garbles the text and the
+    guess itself is clean.
+    """
+    try:
+        from charset_normalizer import from_bytes
+        from charset_normalizer.md import mess_ratio
+    except ImportError:
+        return FALLBACK_ENCODING
+    try:
+        text = codecs.getincrementaldecoder(FALLBACK_ENCODING)().decode(sample)
+    except UnicodeDecodeError:
+        text = None
+    if text is not None and mess_ratio(text, _MAX_MESS) <= _MAX_MESS:
+        return FALLBACK_ENCODING
+    best = from_bytes(sample).best()
+    if best is None or best.chaos > _MAX_MESS:
+        return FALLBACK_ENCODING
+    return best.encoding
+
+
+def _decode_chunks(stream, head, encoding, errors):
+    """Decodes `head` plus the rest of `stream` chunk by chunk, enforcing the byte and character limits."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    parts, size, chars, chunk = [], 0, 0, head
+    while chunk:
+        size += len(chunk)
+        if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+            raise _too_large("file", f"{MAX_UPLOAD_BYTES} bytes")
+        text = decoder.decode(chunk)
+        chars += len(text)
+        if MAX_REPORT_CHARS and chars > MAX_REPORT_CHARS:
+            raise _too_large("report", f"{MAX_REPORT_CHARS} characters")
+        parts.append(text)
+        chunk = stream.read(CHUNK_SIZE)
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts), size
+
+
+def decode_text_stream(stream, charset=None):
+    """
+    Reads a binary text stream in CHUNK_SIZE pieces and decodes it incrementally,
+    so the raw bytes are never held in memory all at once. The encoding comes
+    from `charset` (e.g. the upload's Content-Type), a BOM, or else UTF-8; text
+    that turns out not to be UTF-8 is re-read from the start with a detected or
+    fallback encoding. Returns (text, encoding, size_in_bytes).
+    """
+    head = stream.read(CHUNK_SIZE)
+    encoding = charset or _sniff_encoding(head) or "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise UploadError(f"Unknown character encoding: {encoding}", 415)
+
+    try:
+        text, size = _decode_chunks(stream, head, encoding, "strict")
+        return text, encoding, size
+    except UnicodeDecodeError:
+        if not stream.seekable():
+            raise UploadError(f"The file is not valid {encoding} text.", 422)
+    stream.seek(0)
+    head = stream.read(CHUNK_SIZE)
+    encoding = _detect_encoding(head)
+    text, size = _decode_chunks(stream, head, encoding, "replace")
+    print(f"↻ Upload was not UTF-8; decoded as {encoding}")
+    return text, encoding, size
+
+
+# --- PDF / DOCX extraction (runs in worker processes) ---
+
+def _extract_pdf(path, max_chars):
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+
+    try:
+        reader = PdfReader(path)
+        if reader.is_encrypted and not reader.decrypt(""):
+            return None, "The PDF is password-protected."
+        parts, chars = [], 0
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            chars += len(text)
+            if max_chars and chars > max_chars:
+                break
+    except (PdfReadError, ValueError, KeyError) as e:
+        return None, f"Could not read the PDF: {e}"
+    return "\n\n".join(part.strip() for part in parts if part.strip()), None
+
+
+def _extract_docx(path, max_chars):
+    import zipfile
+    import docx
+
+    try:
+        document = docx.Document(path)
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        return None, f"Could not read the DOCX: {e}"
+    lines, chars = [], 0
+    blocks = [p.text for p in document.paragraphs]
+    # Tables (lab panels, vitals) follow the body text, one row per line
+    for table in document.tables:
+        for row in table.rows:
+            blocks.append(" | ".join(cell.text.strip() for cell in row.cells))
+    for text in blocks:
+        lines.append(text)
+        chars += len(text) + 1
+        if max_chars and chars > max_chars:
+            break
+    return "\n".join(lines).strip(), None
+
+
+_EXTRACTORS = {"pdf": _extract_pdf, "docx": _extract_docx}
+
+
+def _extract(kind, path, max_chars, conn):
+    """Extraction process entry point: sends (text, error) for one document on disk back over `conn`."""
+    try:
+        conn.send(_EXTRACTORS[kind](path, max_chars))
+    finally:
+        conn.close()
+
+
+def _get_context():
+    """
+    The multiprocessing context for extraction processes. Never plain fork:
+    the web worker is multi-threaded (bridge loop, job workers, other
+    requests), and forking it can deadlock the child. A forkserver that has
+    already imported this module starts each process cheaply; spawn is the
+    fallback where forkserver isn't available. The entry script is not
+    preloaded: it may be the whole app, with side effects at import.
+    """
+    global _context
+    with _context_lock:
+        if _context is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                _context = multiprocessing.get_context("forkserver")
+                _context.set_forkserver_preload([__name__])
+            else:
+                _context = multiprocessing.get_context("spawn")
+        return _context
+
+
+def _run_extraction(kind, path):
+    """
+    Extracts one document in a process of its own, which is killed if it
+    takes longer than EXTRACT_TIMEOUT_SECONDS, so a hostile file can't leave
+    a process behind. At most EXTRACT_WORKERS run at once.
+    """
+    if not _slots.acquire(timeout=EXTRACT_TIMEOUT_SECONDS):
+        raise UploadError("Too many documents are being extracted right now; please retry.", 503)
+    try:
+        context = _get_context()
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_extract, args=(kind, path, MAX_REPORT_CHARS, sender), daemon=True)
+        try:
+            process.start()
+        except Exception as e:
+            receiver.close()
+            print(f"⚠ Could not start a {kind} extraction process: {e}")
+            raise UploadError("Text extraction is unavailable right now; please retry.", 503)
+        finally:
+            sender.close()
+        try:
+            if not receiver.poll(EXTRACT_TIMEOUT_SECONDS):
+                raise UploadError(f"Text extraction took longer than {EXTRACT_TIMEOUT_SECONDS:g}s.", 422)
+            return receiver.recv()
+        except EOFError:
+            raise UploadError(f"The {kind.upper()} could not be processed (the extractor crashed).", 422)
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+                if process.is_alive():
+                    process.kill()
+            process.join()
+    finally:
+        _slots.release()
+
+
+def _check_library(kind):
+    # Only the extraction processes import the parser; here it's enough to know it's installed
+    module, package = ("pypdf", "pypdf") if kind == "pdf" else ("docx", "python-docx")
+    if importlib.util.find_spec(module) is None:
+        raise UploadError(f".{kind} uploads need the {package} package on the server (pip install {package}).", 415)
+
+
+def _spool_to_disk(stream, suffix):
+    """Copies the upload to a temp file in chunks, enforcing the byte limit; returns (path, size)."""
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="mediagent_upload_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+                    raise _too_large("file", f"{MAX_UPLOAD_BYTES} bytes")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size
+
+
+def extract_document(stream, kind):
+    """
+    Extracts the text of a PDF or DOCX stream in a separate process, so parsing
+    never blocks (or crashes) a request thread. Returns (text, size_in_bytes).
+    """
+    _check_library(kind)
+    path, size = _spool_to_disk(stream, "." + kind)
+    try:
+        text, error = _run_extraction(kind, path)
+    finally:
+        os.remove(path)
+    if error:
+        raise UploadError(error, 422)
+    if not text.strip():
+        raise UploadError(f"No text could be extracted from the {kind.upper()} (is it a scanned image?).", 422)
+    if MAX_REPORT_CHARS and len(text) > MAX_REPORT_CHARS:
+        raise _too_large("report", f"{MAX_REPORT_CHARS} characters")
+    return text, size
+
+
+def read_upload(upload):
+    """
+    Turns an uploaded report (a werkzeug FileStorage) into text with bounded
+    memory: .txt files are decoded incrementally, .pdf and .docx files are
+    extracted in separate processes. Returns (text, info) where info has the
+    filename, kind, encoding and size; raises UploadError (413, 415 or 422).
+    """
+    kind = upload_kind(upload.filename)
+    with span("read_upload", kind=kind) as current:
+        try:
+            if kind == "text":
+                text, encoding, size = decode_text_stream(upload.stream, upload.mimetype_params.get("charset"))
+            else:
+                encoding = None
+                text, size = extract_document(upload.stream, kind)
+        except UploadError as e:
+            UPLOADS.inc(kind=kind, outcome=str(e.status_code))
+            raise
+        current.set(bytes=size, chars=len(text))
+    UPLOADS.inc(kind=kind, outcome="ok")
+    return text, {"filename": upload.filename, "kind": kind, "encoding": encoding, "bytes": size, "chars": len(text)}
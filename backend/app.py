@@ -1,244 +1,1009 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from dotenv import load_dotenv
-import json
-import os
-import sys
-
-# Ensure the 'Utils' directory is in the path to import Agents
-# This is required because Flask runs from a different context than the original Main.py
-sys.path.append(os.path.join(os.path.dirname(__file__), 'Utils'))
-
-# Imports the Agent classes from Utils/Agents.py (must be present)
-try:
-    from Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam
-except ImportError:
-    print("FATAL ERROR: Could not import Agent classes. Ensure 'Utils/Agents.py' exists.")
-    sys.exit(1)
-
-
-# --- Initialization ---
-# Load API key from .env before Flask starts
-# Get the directory where app.py is located
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-ENV_PATH = os.path.join(BASE_DIR, '.env')
-
-# Try loading .env from multiple locations
-# First, try the current directory (where app.py is)
-if os.path.exists(ENV_PATH):
-    # Handle BOM (Byte Order Mark) that Windows sometimes adds to UTF-8 files
-    # Read the file and remove BOM if present, then parse manually if needed
-    try:
-        with open(ENV_PATH, 'r', encoding='utf-8-sig') as f:
-            # Read and parse manually to handle BOM
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip().strip('"').strip("'")  # Remove quotes
-                    os.environ[key] = value
-        print(f"✓ Loaded .env from: {ENV_PATH} (handled BOM)")
-    except Exception as e:
-        # Fallback to standard load_dotenv
-        load_dotenv(dotenv_path=ENV_PATH, override=True)
-        print(f"✓ Loaded .env from: {ENV_PATH} (standard method)")
-else:
-    # Try loading from current directory without specifying path (searches current and parent dirs)
-    result = load_dotenv()
-    if result:
-        print(f"✓ Loaded .env from auto-detected location")
-    else:
-        # Try parent directory
-        parent_env = os.path.join(os.path.dirname(BASE_DIR), '.env')
-        if os.path.exists(parent_env):
-            try:
-                with open(parent_env, 'r', encoding='utf-8-sig') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#') and '=' in line:
-                            key, value = line.split('=', 1)
-                            key = key.strip()
-                            value = value.strip().strip('"').strip("'")
-                            os.environ[key] = value
-                print(f"✓ Loaded .env from: {parent_env} (handled BOM)")
-            except Exception:
-                load_dotenv(dotenv_path=parent_env, override=True)
-                print(f"✓ Loaded .env from: {parent_env} (standard method)")
-        else:
-            print(f"⚠ .env file not found. Tried:")
-            print(f"  - {ENV_PATH}")
-            print(f"  - {parent_env}")
-            print(f"  - Auto-detection (current and parent directories)")
-
-# Verify that the API key is loaded
-if 'GOOGLE_API_KEY' not in os.environ:
-    print("\n" + "="*60)
-    print("WARNING: GOOGLE_API_KEY not found in environment variables.")
-    print("="*60)
-    print(f"Please create a .env file in: {BASE_DIR}")
-    print("Format: GOOGLE_API_KEY=\"YOUR_KEY\"")
-    print("="*60 + "\n")
-else:
-    # Mask the key for security (show first 10 and last 4 characters)
-    api_key = os.environ.get('GOOGLE_API_KEY', '')
-    masked_key = api_key[:10] + "..." + api_key[-4:] if len(api_key) > 14 else "***"
-    print(f"✓ GOOGLE_API_KEY loaded successfully: {masked_key}")
-
-app = Flask(__name__)
-# Enable CORS for all routes to allow frontend communication
-CORS(app)
-# ----------------------
-
-# Core logic function, extracted from your original Main.py
-def run_analysis(medical_report: str) -> str:
-    """
-    Runs the multi-agent analysis on a given medical report string.
-    """
-    if not medical_report or len(medical_report.strip()) < 50:
-        return "Error: Medical report is too short or empty. Analysis aborted."
-    
-    agents = {
-        "Cardiologist": Cardiologist(medical_report),
-        "Psychologist": Psychologist(medical_report),
-        "Pulmonologist": Pulmonologist(medical_report)
-    }
-
-    # Function to run each agent and get their response
-    def get_response(agent_name, agent):
-        response = agent.run()
-        return agent_name, response
-
-    # Run the agents concurrently and collect responses
-    responses = {}
-    print("--- Running Specialized Agents Concurrently ---")
-    with ThreadPoolExecutor() as executor:
-        futures = {executor.submit(get_response, name, agent): name for name, agent in agents.items()}
-        
-        for future in as_completed(futures):
-            agent_name, response = future.result()
-            responses[agent_name] = response
-            print(f"✅ {agent_name} finished analysis.")
-            
-    # Run the MultidisciplinaryTeam agent to generate the final diagnosis
-    team_agent = MultidisciplinaryTeam(
-        cardiologist_report=responses.get("Cardiologist", "No Cardiologist Report"),
-        psychologist_report=responses.get("Psychologist", "No Psychologist Report"),
-        pulmonologist_report=responses.get("Pulmonologist", "No Pulmonologist Report")
-    )
-    
-    print("--- Running Multidisciplinary Team Synthesis ---")
-    final_diagnosis = team_agent.run()
-    
-    return final_diagnosis
-
-
-# --- API Endpoints ---
-
-@app.route('/', methods=['GET'])
-def home():
-    """Simple check to ensure the API is running."""
-    return jsonify({
-        "status": "API is running",
-        "message": "Use POST /process_string (JSON body) or POST /process_file (File Upload) for analysis."
-    })
-
-@app.route('/process_string', methods=['POST'])
-def process_string():
-    """
-    Analyzes a medical report provided directly as a string in the JSON body.
-    Expected JSON: {"report_content": "Patient reports severe chest pain..."}
-    """
-    data = request.get_json()
-    if not data or 'report_content' not in data:
-        return jsonify({"error": "Missing 'report_content' in request body."}), 400
-    
-    report_content = data['report_content']
-    
-    try:
-        # Check if API key is configured before processing
-        if 'GOOGLE_API_KEY' not in os.environ:
-            return jsonify({
-                "error": "API configuration error. GOOGLE_API_KEY is not set.",
-                "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
-            }), 500
-        
-        final_diagnosis = run_analysis(report_content)
-        
-        return jsonify({
-            "status": "success",
-            "diagnosis": final_diagnosis
-        })
-    except ValueError as ve:
-        # Handle API key errors specifically
-        if "GOOGLE_API_KEY" in str(ve):
-            print(f"API Key Error: {ve}")
-            return jsonify({
-                "error": "API configuration error.",
-                "message": str(ve),
-                "help": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
-            }), 500
-        raise
-    except Exception as e:
-        print(f"An error occurred during analysis: {e}")
-        return jsonify({"error": "Internal server error during agent execution.", "details": str(e)}), 500
-
-@app.route('/process_file', methods=['POST'])
-def process_file():
-    """
-    Analyzes the text content of a medical report file uploaded via form data.
-    The frontend should send the file under the key 'file'.
-    """
-    # 1. Check if the file part is present in the request
-    if 'file' not in request.files:
-        return jsonify({"error": "Missing file upload. Please submit a file under the form data key 'file'."}), 400
-    
-    file = request.files['file']
-    
-    # 2. Check if a file was actually selected
-    if file.filename == '':
-        return jsonify({"error": "No file selected."}), 400
-        
-    # Optional: Check file extension (e.g., must be a .txt file)
-    if not file.filename.lower().endswith('.txt'):
-        return jsonify({"error": "Invalid file type. Only .txt files are accepted for analysis."}), 415
-
-    if file:
-        try:
-            # Check if API key is configured before processing
-            if 'GOOGLE_API_KEY' not in os.environ:
-                return jsonify({
-                    "error": "API configuration error. GOOGLE_API_KEY is not set.",
-                    "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
-                }), 500
-            
-            # 3. Read the file content and decode it into a standard string (UTF-8)
-            report_content = file.read().decode('utf-8')
-            
-            # 4. Run the analysis with the extracted text
-            final_diagnosis = run_analysis(report_content)
-            
-            return jsonify({
-                "status": "success",
-                "diagnosis": final_diagnosis,
-                "filename_processed": file.filename
-            })
-        except ValueError as ve:
-            # Handle API key errors specifically
-            if "GOOGLE_API_KEY" in str(ve):
-                print(f"API Key Error: {ve}")
-                return jsonify({
-                    "error": "API configuration error.",
-                    "message": str(ve),
-                    "help": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
-                }), 500
-            raise
-        except Exception as e:
-            print(f"An error occurred during file processing or analysis: {e}")
-            return jsonify({"error": "Internal server error during processing.", "details": str(e)}), 500
-
-
-if __name__ == '__main__':
-    # Run locally using python app.py
-    app.run(debug=True, host='0.0.0.0')
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Ensure the 'Utils' directory is in the path to import Agents
+# This is required because Flask runs from a different context than the original Main.py
+sys.path.append(os.path.join(os.path.dirname(__file__), 'Utils'))
+
+# --- Initialization ---
+# Load .env (API key and MEDIAGENT_* settings) before anything reads the environment;
+# every Utils module reads its settings at import time
+from Config import BASE_DIR, load_env
+load_env()
+
+# Imports the Agent classes and the rest of the app's modules from Utils/
+try:
+    from Agents import (
+        SpecialistAgent, MultidisciplinaryTeam,
+        PROMPT_TEMPLATES, agent_cache, hedge_policy, preload, warm_up
+    )
+    from Backends import backend_spec_for_role, requires_google_api_key
+    from AsyncRuntime import iter_sync, run_sync
+    from Batch import MAX_BATCH_CONCURRENCY, analyze_reports, iter_reports
+    from Cache import create_cache, make_cache_key, normalize_report
+    from History import HISTORY_CORS_ORIGINS, create_history, history_authorized, stale_outputs
+    from JobQueue import SUCCEEDED, FAILED, create_job_queue
+    from LLMPool import pool_stats
+    from Preprocess import PreparedReport, compact_specialist_report
+    from Registry import registry
+    from Preprocess import settings_signature as preprocess_signature
+    from Triage import triage
+    from Triage import settings_signature as triage_signature
+    from Structured import STRUCTURED_OUTPUT, compact_assessment, to_dict, validate_output
+    from Resilience import Deadline, REQUEST_DEADLINE_SECONDS, SYNTHESIS_RESERVE_SECONDS
+    from Telemetry import CACHE_LOOKUPS, HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, metrics, span
+    from Uploads import UploadError, batch_size_limit, read_upload, request_size_limit, upload_kind
+except ImportError as e:
+    # Tell a missing third-party package (pydantic, asgiref, ...) apart from a broken Utils module
+    missing = (e.name or "").split(".")[0]
+    if missing and not os.path.exists(os.path.join(BASE_DIR, "Utils", missing + ".py")):
+        print(f"FATAL ERROR: {e}. Install the backend requirements: pip install -r requirements.txt")
+    else:
+        print(f"FATAL ERROR: Could not import the app modules from Utils/: {e}")
+    sys.exit(1)
+
+
+# Verify that the API key is loaded
+if 'GOOGLE_API_KEY' not in os.environ:
+    print("\n" + "="*60)
+    print("WARNING: GOOGLE_API_KEY not found in environment variables.")
+    print("="*60)
+    print(f"Please create a .env file in: {BASE_DIR}")
+    print("Format: GOOGLE_API_KEY=\"YOUR_KEY\"")
+    print("="*60 + "\n")
+else:
+    # Mask the key for security (show first 10 and last 4 characters)
+    api_key = os.environ.get('GOOGLE_API_KEY', '')
+    masked_key = api_key[:10] + "..." + api_key[-4:] if len(api_key) > 14 else "***"
+    print(f"✓ GOOGLE_API_KEY loaded successfully: {masked_key}")
+
+app = Flask(__name__)
+# Enable CORS to allow frontend communication; stored analyses (patient data) only for the configured origins
+CORS(app, resources={r"/history.*": {"origins": HISTORY_CORS_ORIGINS}, r"/.*": {"origins": "*"}})
+
+# Whole-report result cache; configured via MEDIAGENT_ANALYSIS_CACHE_* (see Utils/Cache.py)
+analysis_cache = create_cache("analysis")
+# Every analysis with its specialist outputs; configured via MEDIAGENT_HISTORY* (see Utils/History.py)
+history = create_history()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.request_endpoint = request.endpoint or "unknown"
+    HTTP_IN_FLIGHT.inc(endpoint=g.request_endpoint)
+
+
+@app.before_request
+def require_history_token():
+    """Stored analyses hold patient data: every /history* route needs the MEDIAGENT_HISTORY_TOKEN bearer token."""
+    if request.method == 'OPTIONS' or not (request.path == '/history' or request.path.startswith('/history/')):
+        return None
+    if history is not None and not history_authorized(request.headers.get('Authorization')):
+        return jsonify({"error": "Missing or invalid history token (Authorization: Bearer <MEDIAGENT_HISTORY_TOKEN>)."}), 401
+    return None
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streaming responses are timed until their headers go out, not until the stream ends
+    if "request_started" in g:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_started,
+            endpoint=g.request_endpoint, method=request.method, status=response.status_code
+        )
+    return response
+
+
+@app.teardown_request
+def finish_request(exc=None):
+    # Popped so a streamed response, whose context is torn down twice, only counts once
+    endpoint = g.pop("request_endpoint", None)
+    if endpoint is not None:
+        HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+# ----------------------
+
+def analysis_cache_key(medical_report: str) -> str:
+    """
+    Cache key for a full analysis: the normalized report plus everything that
+    changes the output (every role's prompt template, backend and model).
+    """
+    roles = [f"{role}:{backend_spec_for_role(role)}:{PROMPT_TEMPLATES[role]}" for role in sorted(PROMPT_TEMPLATES)]
+    return make_cache_key(normalize_report(medical_report), preprocess_signature(), triage_signature(), *roles)
+
+
+def api_key_missing() -> bool:
+    """True when a role runs on Gemini but GOOGLE_API_KEY isn't configured."""
+    return requires_google_api_key(PROMPT_TEMPLATES) and 'GOOGLE_API_KEY' not in os.environ
+
+def lookup_cached_analysis(medical_report: str):
+    """
+    Returns (cache_key, cached_entry); both are None when caching is disabled.
+    An entry is {"diagnosis", "triage", "specialists", "preprocessing"} (see cache_analysis).
+    """
+    if analysis_cache is None:
+        return None, None
+    cache_key = analysis_cache_key(medical_report)
+    cached = analysis_cache.get(cache_key)
+    if not isinstance(cached, dict):
+        # Entries from before the specialist outputs were cached alongside the diagnosis
+        cached = None
+    CACHE_LOOKUPS.inc(cache="analysis", role="", result="miss" if cached is None else "hit")
+    if cached is not None:
+        print("♻️ Returning cached analysis.")
+    return cache_key, cached
+
+# Specialist roles from specialists.json (see Utils/Registry.py), in the order they are started
+SPECIALISTS = registry.roles
+# Most specialists one request runs at once (0 = all); the process-wide
+# MEDIAGENT_MAX_CONCURRENT_CALLS limit still applies on top
+MAX_PARALLEL_SPECIALISTS = int(os.environ.get("MEDIAGENT_MAX_PARALLEL_SPECIALISTS", 6))
+
+
+def prepare_report(medical_report: str):
+    """
+    Decides which specialists to consult (Utils/Triage.py), then splits the report
+    into sections and builds each one's trimmed input (Utils/Preprocess.py).
+    Returns (prepared_report, triage_decision).
+    """
+    with span("preprocess", report_chars=len(medical_report)) as current:
+        decision = triage(medical_report, SPECIALISTS)
+        prepared = PreparedReport(medical_report, SPECIALISTS)
+        for role in decision.skipped:
+            prepared.skip(role)
+        current.set(sections=len(prepared.sections), triage_scores=decision.scores, skipped=decision.skipped)
+    return prepared, decision
+
+
+async def run_specialists(prepared: PreparedReport, deadline: Deadline = None, roles=None):
+    """
+    Runs the consulted specialist agents (or just `roles` of them) concurrently,
+    yielding (agent_name, response, error) in the order they finish. Each agent
+    only sees its own slice of the report. A failed or timed-out agent yields a
+    None response and a short description of what went wrong; otherwise error is None.
+    """
+    names = prepared.roles if roles is None else roles
+    agents = {name: SpecialistAgent(name, prepared.for_role(name)) for name in names}
+    parallel = asyncio.Semaphore(MAX_PARALLEL_SPECIALISTS or len(agents) or 1)
+
+    # Function to run each agent and get their response
+    async def get_response(agent_name, agent):
+        async with parallel:
+            response = await agent.arun(deadline)
+        return agent_name, response, agent.error_message
+
+    tasks = [asyncio.ensure_future(get_response(name, agent)) for name, agent in agents.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            agent_name, response, error = await next_done
+            if error:
+                print(f"✗ {agent_name} failed: {error}")
+            else:
+                print(f"✅ {agent_name} finished analysis.")
+            yield agent_name, response, error
+    finally:
+        # The consumer stopped early (e.g. a streaming client disconnected)
+        for task in tasks:
+            task.cancel()
+
+
+def specialist_placeholder(agent_name: str, error: str = None) -> str:
+    """Stands in for a specialist report that couldn't be produced."""
+    if error:
+        return f"No {agent_name} Report ({agent_name} unavailable: {error})"
+    return f"No {agent_name} Report"
+
+
+def build_team_agent(responses: dict, errors: dict = None, prepared: PreparedReport = None) -> MultidisciplinaryTeam:
+    """
+    Builds the synthesis agent from the compacted reports of the consulted
+    specialists, substituting a placeholder for any that failed. In structured
+    mode a valid answer is passed on as one line per finding instead of its
+    text. Specialists skipped by triage are named as not consulted.
+    """
+    errors = errors or {}
+    consulted = prepared.roles if prepared is not None else list(SPECIALISTS)
+    raw = {name: responses.get(name) or specialist_placeholder(name, errors.get(name)) for name in consulted}
+    compact = {}
+    for name, text in raw.items():
+        assessment = validate_output(name, responses.get(name)) if STRUCTURED_OUTPUT else None
+        compact[name] = compact_specialist_report(compact_assessment(assessment) if assessment else text)
+    if prepared is not None:
+        prepared.record_synthesis(raw.values(), compact.values())
+
+    return MultidisciplinaryTeam(compact, not_consulted=prepared.skipped if prepared is not None else ())
+
+
+def structured_fields(diagnosis: str) -> dict:
+    """{"structured": the parsed diagnosis} for JSON responses in structured mode; empty otherwise."""
+    return {"structured": to_dict(diagnosis)} if STRUCTURED_OUTPUT else {}
+
+
+def report_savings(prepared: PreparedReport, current_span=None) -> dict:
+    """Logs and returns the prompt tokens preprocessing saved on this request."""
+    savings = prepared.savings()
+    print(f"✂ Preprocessing: {savings['sent_tokens']} of {savings['raw_tokens']} estimated prompt tokens sent "
+          f"({savings['saved_fraction']:.0%} saved)")
+    if current_span is not None:
+        current_span.set(raw_tokens=savings["raw_tokens"], sent_tokens=savings["sent_tokens"])
+    return savings
+
+
+def cache_analysis(cache_key: str, decision, responses: dict, diagnosis: str, savings: dict):
+    """
+    Caches a complete run: the diagnosis plus what a cache hit needs to replay
+    the same stream events (triage decision, specialist outputs in finishing
+    order, preprocessing savings). Runs with a failed specialist aren't cached,
+    so a transient API failure isn't replayed.
+    """
+    if cache_key is None or not diagnosis or not all(responses.values()):
+        return
+    analysis_cache.set(cache_key, {
+        "diagnosis": diagnosis,
+        "triage": decision.to_dict(),
+        "specialists": [{"role": name, "report": text} for name, text in responses.items()],
+        "preprocessing": savings,
+    })
+
+
+async def remember_cached_analysis(medical_report: str, cached: dict):
+    """Stores a cache hit in the history like a fresh run. Returns its id, or None."""
+    if history is None:
+        return None
+    prepared, decision = prepare_report(medical_report)
+    responses = {row["role"]: row["report"] for row in cached["specialists"]}
+    return await remember_analysis(medical_report, prepared, decision, responses, {}, cached["diagnosis"])
+
+
+async def remember_analysis(medical_report: str, prepared: PreparedReport, decision, responses: dict,
+                            errors: dict, diagnosis: str = None, error: str = None):
+    """Stores the run in the analysis history (off the event loop). Returns its id, or None."""
+    if history is None:
+        return None
+    outputs = {name: (responses.get(name), errors.get(name)) for name in prepared.roles}
+    inputs = {name: prepared.for_role(name) for name in prepared.roles}
+    try:
+        return await asyncio.to_thread(
+            history.record, medical_report, outputs, diagnosis,
+            inputs=inputs, triage=decision.to_dict(), error=error
+        )
+    except sqlite3.Error as e:
+        print(f"⚠ Could not save the analysis to history: {e}")
+        return None
+
+
+# Core logic function, extracted from your original Main.py
+async def run_analysis_async(medical_report: str, deadline_seconds: float = None) -> str:
+    """
+    Runs the multi-agent analysis on a given medical report string.
+    The specialists are awaited concurrently on the current event loop, so no
+    thread is held while waiting on the model.
+
+    The whole analysis shares one deadline (MEDIAGENT_REQUEST_DEADLINE_SECONDS
+    unless `deadline_seconds` is given). Specialists must finish early enough to
+    leave MEDIAGENT_SYNTHESIS_RESERVE_SECONDS for the synthesis; a specialist
+    that doesn't is cut off and reported to the synthesis as timed out.
+    """
+    if not medical_report or len(medical_report.strip()) < 50:
+        return "Error: Medical report is too short or empty. Analysis aborted."
+
+    with span("analysis", report_chars=len(medical_report)) as current:
+        cache_key, cached = lookup_cached_analysis(medical_report)
+        current.set(cached=cached is not None)
+        if cached is not None:
+            await remember_cached_analysis(medical_report, cached)
+            return cached["diagnosis"]
+
+        deadline = Deadline(deadline_seconds or REQUEST_DEADLINE_SECONDS)
+        prepared, decision = prepare_report(medical_report)
+
+        responses, errors = {}, {}
+        print("--- Running Specialized Agents Concurrently ---")
+        with span("specialists"):
+            async for agent_name, response, error in run_specialists(prepared, deadline.reserve(SYNTHESIS_RESERVE_SECONDS)):
+                responses[agent_name] = response
+                errors[agent_name] = error
+
+        # Run the MultidisciplinaryTeam agent to generate the final diagnosis
+        team_agent = build_team_agent(responses, errors, prepared)
+        savings = report_savings(prepared, current)
+
+        print("--- Running Multidisciplinary Team Synthesis ---")
+        with span("synthesis"):
+            final_diagnosis = await team_agent.arun(deadline)
+        if team_agent.error:
+            current.set(outcome="synthesis_failed")
+            await remember_analysis(medical_report, prepared, decision, responses, errors, error=team_agent.error_message)
+            return f"Error: Multidisciplinary synthesis failed ({team_agent.error_message})."
+        if STRUCTURED_OUTPUT:
+            validate_output(registry.synthesis_role, final_diagnosis)
+        await remember_analysis(medical_report, prepared, decision, responses, errors, final_diagnosis)
+        cache_analysis(cache_key, decision, responses, final_diagnosis, savings)
+        return final_diagnosis
+
+
+def run_analysis(medical_report: str, deadline_seconds: float = None) -> str:
+    """
+    Blocking wrapper around run_analysis_async for the Flask views and scripts.
+    """
+    return run_sync(run_analysis_async(medical_report, deadline_seconds))
+
+
+async def stream_analysis(medical_report: str, deadline_seconds: float = None):
+    """
+    Same pipeline (and deadline budget) as run_analysis_async, but yields
+    (event, data) pairs as work completes:
+      triage      {"mode", "threshold", "scores", "selected", "skipped", "would_skip"} before any specialist runs
+      specialist  {"role", "report", "error"} once per consulted specialist, in finishing order
+                  (plus "structured", the parsed answer, in structured mode)
+      synthesis   {"text"} for each chunk of the multidisciplinary synthesis (not sent in
+                  structured mode: partial JSON can't be rendered)
+      done        {"diagnosis", "preprocessing", "history_id"} with the full synthesis, the tokens
+                  preprocessing saved and the id of the stored analysis (None if history is off),
+                  plus "structured" in structured mode
+      error       {"error"} if the analysis can't run
+    """
+    if not medical_report or len(medical_report.strip()) < 50:
+        yield "error", {"error": "Medical report is too short or empty. Analysis aborted."}
+        return
+
+    cache_key, cached = lookup_cached_analysis(medical_report)
+    if cached is not None:
+        # Replay the stored run so a cache hit sends the same events as a fresh one
+        yield "triage", cached["triage"]
+        for row in cached["specialists"]:
+            event = {"role": row["role"], "report": row["report"], "error": None}
+            if STRUCTURED_OUTPUT:
+                event["structured"] = to_dict(row["report"])
+            yield "specialist", event
+        diagnosis = cached["diagnosis"]
+        if not STRUCTURED_OUTPUT:
+            yield "synthesis", {"text": diagnosis}
+        done = {"diagnosis": diagnosis, "preprocessing": cached["preprocessing"], **structured_fields(diagnosis)}
+        done["history_id"] = await remember_cached_analysis(medical_report, cached)
+        yield "done", done
+        return
+
+    deadline = Deadline(deadline_seconds or REQUEST_DEADLINE_SECONDS)
+    prepared, decision = prepare_report(medical_report)
+    yield "triage", decision.to_dict()
+
+    responses, errors = {}, {}
+    print("--- Streaming Specialized Agents ---")
+    async for agent_name, response, error in run_specialists(prepared, deadline.reserve(SYNTHESIS_RESERVE_SECONDS)):
+        responses[agent_name] = response
+        errors[agent_name] = error
+        event = {
+            "role": agent_name,
+            "report": response or specialist_placeholder(agent_name, error),
+            "error": error,
+        }
+        if STRUCTURED_OUTPUT:
+            event["structured"] = to_dict(response)
+        yield "specialist", event
+
+    print("--- Streaming Multidisciplinary Team Synthesis ---")
+    team_agent = build_team_agent(responses, errors, prepared)
+    savings = report_savings(prepared)
+    chunks = []
+    async for chunk in team_agent.astream(deadline):
+        chunks.append(chunk)
+        if not STRUCTURED_OUTPUT:
+            yield "synthesis", {"text": chunk}
+    final_diagnosis = "".join(chunks)
+
+    if team_agent.error or not final_diagnosis:
+        error = team_agent.error_message or 'empty response'
+        await remember_analysis(medical_report, prepared, decision, responses, errors, error=error)
+        yield "error", {"error": f"The multidisciplinary synthesis failed ({error})."}
+        return
+
+    cache_analysis(cache_key, decision, responses, final_diagnosis, savings)
+    done = {"diagnosis": final_diagnosis, "preprocessing": savings}
+    if STRUCTURED_OUTPUT:
+        assessment = validate_output(registry.synthesis_role, final_diagnosis)
+        done["structured"] = assessment.model_dump() if assessment else None
+    done["history_id"] = await remember_analysis(medical_report, prepared, decision, responses, errors, final_diagnosis)
+    yield "done", done
+
+
+async def reanalyze_async(analysis_id: str, dry_run: bool = False, deadline_seconds: float = None):
+    """
+    Brings a stored analysis up to date with the current prompts, models and
+    preprocessing, recomputing only what changed: the specialists whose prompt
+    template, model or input changed (or that failed, or are newly consulted),
+    then the synthesis if any of its inputs changed. With `dry_run` nothing is
+    recomputed. Returns a summary, or None if the id is unknown.
+    """
+    entry = await asyncio.to_thread(history.get, analysis_id)
+    if entry is None:
+        return None
+
+    with span("reanalysis") as current:
+        prepared, decision = prepare_report(entry["report"])
+        inputs = {name: prepared.for_role(name) for name in prepared.roles}
+        stale, synthesis_stale = stale_outputs(entry, inputs)
+        summary = {
+            "analysis_id": analysis_id,
+            "recomputed": stale,
+            "reused": [name for name in prepared.roles if name not in stale],
+            "synthesis": synthesis_stale,
+        }
+        current.set(recomputed=len(stale), reused=len(summary["reused"]))
+        if not stale and not synthesis_stale:
+            return {**summary, "status": "up_to_date"}
+        if dry_run:
+            return {**summary, "status": "stale"}
+
+        stored = {row["role"]: row for row in entry["specialists"]}
+        responses = {name: stored[name]["output"] for name in summary["reused"]}
+        errors, recomputed = {}, {}
+        deadline = Deadline(deadline_seconds or REQUEST_DEADLINE_SECONDS)
+        if stale:
+            print(f"↻ Re-analyzing {analysis_id}: recomputing {', '.join(stale)}")
+            with span("specialists"):
+                async for agent_name, response, error in run_specialists(
+                        prepared, deadline.reserve(SYNTHESIS_RESERVE_SECONDS), roles=list(stale)):
+                    responses[agent_name], errors[agent_name] = response, error
+                    recomputed[agent_name] = (response, error)
+
+        team_agent = build_team_agent(responses, errors, prepared)
+        with span("synthesis"):
+            final_diagnosis = await team_agent.arun(deadline)
+        error = team_agent.error_message if team_agent.error else None
+        if STRUCTURED_OUTPUT and not error:
+            validate_output(registry.synthesis_role, final_diagnosis)
+        await asyncio.to_thread(
+            history.update, analysis_id, recomputed, prepared.roles,
+            None if error else final_diagnosis, inputs=inputs, triage=decision.to_dict(), error=error
+        )
+        return {**summary, "status": "failed" if error else "reanalyzed", "error": error}
+
+
+# Persistent job queue with local workers; configured via MEDIAGENT_JOB_* (see Utils/JobQueue.py).
+# Each serving process starts its workers at startup (see __main__, gunicorn.conf.py
+# and asgi.py), so jobs left over from a previous run resume without a new submission.
+job_queue = create_job_queue(run_analysis)
+# When set, /process_string and /process_file submit to the queue and wait on the job
+USE_JOB_QUEUE = os.environ.get("MEDIAGENT_USE_JOB_QUEUE", "0") == "1"
+# How long those endpoints wait before answering 202 with the job id to poll
+JOB_WAIT_SECONDS = float(os.environ.get("MEDIAGENT_JOB_WAIT_SECONDS", 300))
+
+
+def collect_state_metrics():
+    """Point-in-time gauges for /metrics from the stats the pool, caches, hedging and job queue already keep."""
+    samples = []
+    pool = pool_stats()
+    for key, help_text in (
+        ("in_flight", "Model calls holding a call slot."),
+        ("waiting_for_slot", "Model calls queued for a call slot."),
+        ("max_concurrent_calls", "Size of the model call slot pool."),
+        ("models", "Pooled model clients."),
+        ("current_calls_per_minute", "Current adaptive rate limit (0 = unlimited)."),
+        ("throttled_responses", "Rate-limit (429) responses seen."),
+    ):
+        samples.append((f"mediagent_pool_{key}", help_text, {}, pool[key]))
+    for name, cache in (("analysis", analysis_cache), ("agent", agent_cache)):
+        if cache is not None:
+            stats = cache.stats()
+            samples.append(("mediagent_cache_entries", "Entries held by each result cache.", {"cache": name}, stats["entries"]))
+            samples.append(("mediagent_cache_hit_rate", "Hit rate of each result cache since start.", {"cache": name}, stats["hit_rate"]))
+    hedges = hedge_policy.stats()
+    for key in ("primary_calls", "hedges_fired", "hedges_won", "hedges_over_budget"):
+        samples.append(("mediagent_hedge_calls", "Hedging counters since start.", {"kind": key}, hedges[key]))
+    for status, count in job_queue.stats().items():
+        if status != "workers":
+            samples.append(("mediagent_jobs", "Jobs in the queue database by status.", {"status": status}, count))
+    if history is not None:
+        for status, count in history.stats().items():
+            samples.append(("mediagent_history_analyses", "Analyses kept in the history database by status.", {"status": status}, count))
+    samples.append(("mediagent_threads", "Threads alive in this process.", {}, threading.active_count()))
+    return samples
+
+
+metrics.add_collector(collect_state_metrics)
+
+
+def job_response(job: dict) -> dict:
+    """Public view of a job: status and timings plus the diagnosis or error once finished."""
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["status"] == SUCCEEDED:
+        response["diagnosis"] = job["result"]
+        response.update(structured_fields(job["result"]))
+    elif job["status"] == FAILED:
+        response["error"] = job["error"]
+    return response
+
+
+def analyze_for_request(medical_report: str):
+    """
+    Runs the analysis for a synchronous endpoint. Returns (diagnosis, pending_job):
+    pending_job is None when the diagnosis is ready, or the job to poll when the
+    queue didn't finish within JOB_WAIT_SECONDS.
+    """
+    if not USE_JOB_QUEUE:
+        return run_analysis(medical_report), None
+
+    job_id, _ = job_queue.submit(medical_report)
+    job = job_queue.wait(job_id, timeout=JOB_WAIT_SECONDS)
+    if job["status"] not in (SUCCEEDED, FAILED):
+        return None, job_response(job)
+    # Keep the old contract: failures come back as the diagnosis text
+    return job["result"] or job["error"], None
+
+
+# Set once this process has warmed its model clients (see /ready)
+_readiness = {}
+_readiness_lock = threading.Lock()
+
+
+def ensure_ready() -> dict:
+    """
+    Warms this process once: imports the model libraries, parses the prompt
+    templates and creates the pooled client for every role. Returns the
+    readiness record; raises if warming fails, so the next probe retries.
+    """
+    if _readiness:
+        return _readiness
+    with _readiness_lock:
+        if not _readiness:
+            started = time.perf_counter()
+            models = warm_up()
+            _readiness.update({
+                "models": models,
+                "warmup_seconds": round(time.perf_counter() - started, 3),
+                "pid": os.getpid(),
+            })
+            print(f"✓ Worker {os.getpid()} ready: {len(models)} model client(s) warmed in {_readiness['warmup_seconds']}s")
+    return _readiness
+
+
+def parse_time(value):
+    """Epoch seconds or an ISO 8601 date/time (query parameters of /history); None when absent."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def history_filters(args) -> dict:
+    """list() filters from request arguments; raises ValueError on a malformed time."""
+    return {
+        "patient": args.get("patient") or None,
+        "since": parse_time(args.get("since")),
+        "until": parse_time(args.get("until")),
+    }
+
+
+def history_disabled_response():
+    return jsonify({"error": "Analysis history is disabled (MEDIAGENT_HISTORY=0)."}), 404
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def upload_error_response(error: UploadError):
+    return jsonify({"error": str(error)}), error.status_code
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Answers oversized uploads (refused before they are read) with JSON rather than an HTML page."""
+    return jsonify({"error": f"Upload too large. The limit is {request.max_content_length:,} bytes."}), 413
+
+
+# --- API Endpoints ---
+
+@app.route('/', methods=['GET'])
+def home():
+    """Simple check to ensure the API is running."""
+    return jsonify({
+        "status": "API is running",
+        "message": "Use POST /process_string (JSON body) or POST /process_file (File Upload) for analysis."
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Reports hit/miss counters for the whole-report and per-agent caches."""
+    return jsonify({
+        name: cache.stats() if cache is not None else {"enabled": False}
+        for name, cache in (("analysis", analysis_cache), ("agent", agent_cache))
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Prometheus text-format metrics: stage and agent latency histograms, in-flight
+    gauges, failure and token counters, per-role cache lookups and pool state.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe. The first call warms this worker (model libraries, prompt
+    templates, one pooled client per role), so point the load balancer's
+    readiness check here and GET / at liveness. 503 until the worker can serve.
+    """
+    if api_key_missing():
+        return jsonify({"status": "not ready", "error": "GOOGLE_API_KEY is not set."}), 503
+    try:
+        return jsonify({"status": "ready", **ensure_ready()})
+    except Exception as e:
+        print(f"⚠ Warm-up failed: {e}")
+        return jsonify({"status": "not ready", "error": str(e)}), 503
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queues a report for analysis and returns immediately with the job id.
+    Expected JSON: {"report_content": "...", "priority": 0}  (higher priority runs first)
+    Submitting a report identical to one already queued or running returns that job.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'report_content' not in data:
+        return jsonify({"error": "Missing 'report_content' in request body."}), 400
+
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'priority' must be an integer."}), 400
+
+    if api_key_missing():
+        return jsonify({
+            "error": "API configuration error. GOOGLE_API_KEY is not set.",
+            "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+        }), 500
+
+    job_id, deduplicated = job_queue.submit(data['report_content'], priority=priority)
+    return jsonify({**job_response(job_queue.get(job_id)), "deduplicated": deduplicated}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Returns a job's status, and its diagnosis or error once finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job id: {job_id}"}), 404
+    return jsonify(job_response(job))
+
+@app.route('/history', methods=['GET'])
+def list_history():
+    """
+    Past analyses, newest first, one page at a time (no report or output text).
+    Query: page (default 1), per_page (default 20, max 100), patient (name prefix,
+    case-insensitive), report_hash, since / until (epoch seconds or ISO dates).
+    """
+    if history is None:
+        return history_disabled_response()
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        filters = history_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "'page' and 'per_page' must be integers; 'since' and 'until' epoch seconds or ISO dates."}), 400
+    return jsonify(history.list(page, per_page, report_hash=request.args.get('report_hash') or None, **filters))
+
+@app.route('/history/<analysis_id>', methods=['GET'])
+def get_history(analysis_id):
+    """
+    One stored analysis: the report, each specialist's output and the diagnosis.
+    Outputs stored in structured mode also come parsed, under "structured". No model calls.
+    """
+    if history is None:
+        return history_disabled_response()
+    entry = history.get(analysis_id)
+    if entry is None:
+        return jsonify({"error": f"Unknown analysis id: {analysis_id}"}), 404
+    for row in entry["specialists"]:
+        row["structured"] = to_dict(row["output"])
+    entry["structured"] = to_dict(entry["diagnosis"])
+    return jsonify(entry)
+
+@app.route('/history/<analysis_id>/reanalyze', methods=['POST'])
+def reanalyze_history(analysis_id):
+    """
+    Re-runs only the parts of a stored analysis whose prompt template, model or
+    input changed since it was stored, and saves the result. ?dry_run=1 only
+    reports what would be recomputed.
+    """
+    if history is None:
+        return history_disabled_response()
+    dry_run = request.args.get('dry_run', '0') == '1'
+    if not dry_run and api_key_missing():
+        return jsonify({
+            "error": "API configuration error. GOOGLE_API_KEY is not set.",
+            "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+        }), 500
+    summary = run_sync(reanalyze_async(analysis_id, dry_run=dry_run))
+    if summary is None:
+        return jsonify({"error": f"Unknown analysis id: {analysis_id}"}), 404
+    return jsonify({**summary, "analysis": history.get(analysis_id)})
+
+@app.route('/history/reanalyze', methods=['POST'])
+def reanalyze_all_history():
+    """
+    Re-analysis mode over the whole history (or the entries matching JSON
+    {"patient", "since", "until"}), oldest first. Entries that are up to date
+    cost nothing; stale ones are recomputed incrementally. Streams one JSON
+    line per entry: {"analysis_id", "status", "recomputed", "reused", "synthesis"}.
+    {"dry_run": true} only reports what is stale.
+    """
+    if history is None:
+        return history_disabled_response()
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run'))
+    try:
+        ids = history.ids(**history_filters(data))
+    except ValueError:
+        return jsonify({"error": "'since' and 'until' must be epoch seconds or ISO dates."}), 400
+    if not dry_run and api_key_missing():
+        return jsonify({
+            "error": "API configuration error. GOOGLE_API_KEY is not set.",
+            "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+        }), 500
+
+    async def reanalyze_each():
+        for analysis_id in ids:
+            try:
+                summary = await reanalyze_async(analysis_id, dry_run=dry_run)
+            except Exception as e:
+                summary = {"analysis_id": analysis_id, "status": "failed", "error": str(e)}
+            if summary is not None:
+                yield summary
+
+    def generate():
+        for summary in iter_sync(reanalyze_each()):
+            yield json.dumps(summary) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/process_string', methods=['POST'])
+def process_string():
+    """
+    Analyzes a medical report provided directly as a string in the JSON body.
+    Expected JSON: {"report_content": "Patient reports severe chest pain..."}
+    """
+    data = request.get_json()
+    if not data or 'report_content' not in data:
+        return jsonify({"error": "Missing 'report_content' in request body."}), 400
+    
+    report_content = data['report_content']
+    
+    try:
+        # Check if API key is configured before processing
+        if api_key_missing():
+            return jsonify({
+                "error": "API configuration error. GOOGLE_API_KEY is not set.",
+                "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+            }), 500
+        
+        final_diagnosis, pending_job = analyze_for_request(report_content)
+        if pending_job is not None:
+            return jsonify(pending_job), 202
+        
+        return jsonify({
+            "status": "success",
+            "diagnosis": final_diagnosis,
+            **structured_fields(final_diagnosis)
+        })
+    except ValueError as ve:
+        # Handle API key errors specifically
+        if "GOOGLE_API_KEY" in str(ve):
+            print(f"API Key Error: {ve}")
+            return jsonify({
+                "error": "API configuration error.",
+                "message": str(ve),
+                "help": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+            }), 500
+        raise
+    except Exception as e:
+        print(f"An error occurred during analysis: {e}")
+        return jsonify({"error": "Internal server error during agent execution.", "details": str(e)}), 500
+
+@app.route('/process_stream', methods=['POST'])
+def process_stream():
+    """
+    Streams the analysis as Server-Sent Events: one 'specialist' event per agent
+    as it finishes, then 'synthesis' chunks of the final diagnosis, then 'done'.
+    Accepts either a JSON body {"report_content": "..."} or a .txt, .pdf or .docx
+    upload under 'file'.
+    """
+    request.max_content_length = request_size_limit()
+    if 'file' in request.files:
+        try:
+            report_content, _ = read_upload(request.files['file'])
+        except UploadError as e:
+            return upload_error_response(e)
+    else:
+        data = request.get_json(silent=True)
+        if not data or 'report_content' not in data:
+            return jsonify({"error": "Missing 'report_content' in request body or 'file' upload."}), 400
+        report_content = data['report_content']
+
+    if api_key_missing():
+        return jsonify({
+            "error": "API configuration error. GOOGLE_API_KEY is not set.",
+            "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+        }), 500
+
+    def generate():
+        try:
+            for event, data in iter_sync(stream_analysis(report_content)):
+                yield format_sse(event, data)
+        except Exception as e:
+            print(f"An error occurred during streaming analysis: {e}")
+            yield format_sse("error", {"error": "Internal server error during agent execution.", "details": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch():
+    """
+    Analyzes many reports in one request. Upload any number of .txt files and/or
+    .zip archives of .txt files under the form key 'files'. Results stream back
+    as JSON Lines, one record per report in the order they finish:
+    {"report_id", "report_hash", "status", "diagnosis" | "error", "elapsed_seconds"}
+    Optional form field 'concurrency' sets how many reports run at once (default 4,
+    at most MEDIAGENT_MAX_BATCH_CONCURRENCY).
+    """
+    # Refuse oversized batches before the body is read (413); zip members are capped in Utils/Batch.py
+    request.max_content_length = batch_size_limit()
+    uploads = [f for f in request.files.getlist('files') if f.filename]
+    if not uploads:
+        return jsonify({"error": "Missing file upload. Please submit .txt or .zip files under the form data key 'files'."}), 400
+
+    for upload in uploads:
+        if not upload.filename.lower().endswith(('.txt', '.zip')):
+            return jsonify({"error": f"Invalid file type: {upload.filename}. Only .txt and .zip files are accepted."}), 415
+
+    if api_key_missing():
+        return jsonify({
+            "error": "API configuration error. GOOGLE_API_KEY is not set.",
+            "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+        }), 500
+
+    try:
+        concurrency = int(request.form.get('concurrency', 4))
+    except ValueError:
+        concurrency = 0
+    if concurrency < 1:
+        return jsonify({"error": "'concurrency' must be a positive integer."}), 400
+    concurrency = min(concurrency, MAX_BATCH_CONCURRENCY)
+
+    # Copy uploads out of the request so they outlive it while the response streams;
+    # each is only read from disk when its turn comes
+    upload_dir = tempfile.mkdtemp(prefix="mediagent_batch_")
+    paths = []
+    for index, upload in enumerate(uploads):
+        path = os.path.join(upload_dir, str(index), os.path.basename(upload.filename))
+        os.makedirs(os.path.dirname(path))
+        upload.save(path)
+        paths.append(path)
+
+    def generate():
+        try:
+            records = analyze_reports(iter_reports(paths), run_analysis_async, concurrency)
+            for record in iter_sync(records):
+                yield json.dumps(record) + "\n"
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/extract_text', methods=['POST'])
+def extract_text():
+    """
+    Returns the text of an uploaded report without analyzing it, so the frontend
+    can stream the analysis of a .pdf or .docx the same way as a .txt.
+    Upload the file under the form data key 'file'.
+    """
+    request.max_content_length = request_size_limit()
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({"error": "Missing file upload. Please submit a file under the form data key 'file'."}), 400
+    try:
+        report_content, info = read_upload(request.files['file'])
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"report_content": report_content, **info})
+
+@app.route('/process_file', methods=['POST'])
+def process_file():
+    """
+    Analyzes the text content of a medical report file uploaded via form data.
+    The frontend should send the file under the key 'file'. Accepts .txt (any
+    common encoding), .pdf and .docx, up to MEDIAGENT_MAX_UPLOAD_BYTES.
+    """
+    # 1. Check if the file part is present in the request (refusing oversized uploads unread)
+    request.max_content_length = request_size_limit()
+    if 'file' not in request.files:
+        return jsonify({"error": "Missing file upload. Please submit a file under the form data key 'file'."}), 400
+    
+    file = request.files['file']
+    
+    # 2. Check if a file was actually selected
+    if file.filename == '':
+        return jsonify({"error": "No file selected."}), 400
+        
+    # Check file extension (.txt, .pdf or .docx)
+    try:
+        upload_kind(file.filename)
+    except UploadError as e:
+        return upload_error_response(e)
+
+    if file:
+        try:
+            # Check if API key is configured before processing
+            if api_key_missing():
+                return jsonify({
+                    "error": "API configuration error. GOOGLE_API_KEY is not set.",
+                    "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+                }), 500
+            
+            # 3. Read the file content into a string: text is decoded in chunks,
+            # PDF/DOCX text is extracted in a worker process
+            try:
+                report_content, _ = read_upload(file)
+            except UploadError as e:
+                return upload_error_response(e)
+            
+            # 4. Run the analysis with the extracted text
+            final_diagnosis, pending_job = analyze_for_request(report_content)
+            if pending_job is not None:
+                return jsonify({**pending_job, "filename_processed": file.filename}), 202
+            
+            return jsonify({
+                "status": "success",
+                "diagnosis": final_diagnosis,
+                **structured_fields(final_diagnosis),
+                "filename_processed": file.filename
+            })
+        except ValueError as ve:
+            # Handle API key errors specifically
+            if "GOOGLE_API_KEY" in str(ve):
+                print(f"API Key Error: {ve}")
+                return jsonify({
+                    "error": "API configuration error.",
+                    "message": str(ve),
+                    "help": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+                }), 500
+            raise
+        except Exception as e:
+            print(f"An error occurred during file processing or analysis: {e}")
+            return jsonify({"error": "Internal server error during processing.", "details": str(e)}), 500
+
+
+if __name__ == '__main__':
+    # Run locally using python app.py (development server with the reloader);
+    # in production use: gunicorn -c gunicorn.conf.py wsgi:application
+    debug = os.environ.get("MEDIAGENT_DEBUG", "1") == "1"
+    # With the reloader, only the child process that serves requests runs jobs
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_queue.start()
+    app.run(debug=debug, host='0.0.0.0')
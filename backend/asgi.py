@@ -0,0 +1,85 @@
+"""
+ASGI entry point.
+
+POST /process_string is served natively on the event loop via run_analysis_async,
+so one worker process can hold hundreds of in-flight analyses. Every other route
+(including CORS preflight) falls through to the Flask app.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app, api_key_missing, job_queue, run_analysis_async, structured_fields, BASE_DIR
+
+wsgi_fallback = WsgiToAsgi(flask_app)
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            # Match flask-cors, which allows every origin on the Flask routes
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def process_string(receive, send):
+    """Async twin of app.process_string with the same request and response shapes."""
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'report_content' not in data:
+        return await _send_json(send, {"error": "Missing 'report_content' in request body."}, 400)
+
+    if api_key_missing():
+        return await _send_json(send, {
+            "error": "API configuration error. GOOGLE_API_KEY is not set.",
+            "message": f"Please create a .env file in {BASE_DIR} with: GOOGLE_API_KEY=\"YOUR_KEY\""
+        }, 500)
+
+    try:
+        final_diagnosis = await run_analysis_async(data['report_content'])
+    except Exception as e:
+        print(f"An error occurred during analysis: {e}")
+        return await _send_json(send, {"error": "Internal server error during agent execution.", "details": str(e)}, 500)
+
+    await _send_json(send, {"status": "success", "diagnosis": final_diagnosis, **structured_fields(final_diagnosis)})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Resume jobs left queued or running by a previous process
+            job_queue.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/process_string":
+        return await process_string(receive, send)
+    return await wsgi_fallback(scope, receive, send)
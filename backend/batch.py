@@ -0,0 +1,57 @@
+"""
+Batch-analyzes a directory (or files / .zip archives) of medical reports.
+
+Results are appended to a JSONL file one line per report as they finish, so an
+interrupted run can be restarted with the same command and only the reports
+without a successful result are redone.
+
+Usage:
+    python batch.py "Medical Reports" --output results.jsonl --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'Utils'))
+from app import api_key_missing, run_analysis_async
+from Batch import JSONLWriter, analyze_reports, iter_reports, load_completed
+
+
+async def run_batch(paths, output, concurrency):
+    completed = load_completed(output)
+    if completed:
+        print(f"↻ Resuming: skipping {len(completed)} reports already in {output}")
+
+    succeeded = failed = 0
+    with JSONLWriter(output) as writer:
+        async for record in analyze_reports(iter_reports(paths), run_analysis_async, concurrency, skip=completed):
+            writer.write(record)
+            if record["status"] == "success":
+                succeeded += 1
+                print(f"✅ {record['report_id']} ({record['elapsed_seconds']}s)")
+            else:
+                failed += 1
+                print(f"✗ {record['report_id']}: {record['error']}")
+
+    print(f"\nDone: {succeeded} succeeded, {failed} failed, {len(completed)} skipped. Results in {output}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many medical reports and write results as JSONL.")
+    parser.add_argument("paths", nargs="+", help="Report files, directories or .zip archives")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Reports analyzed at the same time")
+    args = parser.parse_args()
+
+    if api_key_missing():
+        print("GOOGLE_API_KEY is not set. Create a .env file next to app.py first.")
+        return 1
+
+    failed = asyncio.run(run_batch(args.paths, args.output, args.concurrency))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
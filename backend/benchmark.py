@@ -0,0 +1,304 @@
+"""
+End-to-end benchmark of the analysis pipeline.
+
+Replays the bundled sample reports (or any report files / directories / .zip
+archives) at a given concurrency against run_analysis directly and against the
+/process_string and /process_file endpoints (through Flask's test client, so
+no server is needed). By default every role runs on the offline fake backend
+with injected latency, so runs are deterministic and need no API key.
+
+Reports throughput, p50/p95/p99 latency, time per agent role, the process's
+memory high-water mark and peak thread count, and writes the same numbers as
+JSON so runs can be compared across commits.
+
+Usage:
+    python benchmark.py --requests 50 --concurrency 8 --latency lognormal:0.3,0.4
+    python benchmark.py --output bench.json --baseline bench_main.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPORTS_DIR = os.path.join(BASE_DIR, "Medical Reports")
+TARGETS = ("run_analysis", "process_string", "process_file")
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(seconds):
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def max_rss_mb():
+    """Peak resident memory of this process in MB, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ThreadSampler:
+    """Samples threading.active_count() in the background and keeps the peak."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="thread-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class AgentTimer:
+    """Records how long each Agent.arun call takes, per role, while installed."""
+
+    def __init__(self, agent_class):
+        self.agent_class = agent_class
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._original = None
+
+    def __enter__(self):
+        self._original = original = self.agent_class.arun
+        timer = self
+
+        async def timed_arun(agent, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await original(agent, *args, **kwargs)
+            finally:
+                with timer._lock:
+                    timer.samples.setdefault(agent.role, []).append(time.perf_counter() - started)
+
+        self.agent_class.arun = timed_arun
+        return self
+
+    def __exit__(self, *exc):
+        self.agent_class.arun = self._original
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def summary(self):
+        with self._lock:
+            return {role: summarize(seconds) for role, seconds in sorted(self.samples.items())}
+
+
+def make_callers(app_module, client):
+    """One blocking callable per target, each taking (filename, report) and returning success."""
+
+    def call_run_analysis(filename, report):
+        diagnosis = app_module.run_analysis(report)
+        return bool(diagnosis) and not diagnosis.startswith("Error:")
+
+    def call_process_string(filename, report):
+        response = client.post("/process_string", json={"report_content": report})
+        return response.status_code == 200 and not response.get_json()["diagnosis"].startswith("Error:")
+
+    def call_process_file(filename, report):
+        data = {"file": (io.BytesIO(report.encode("utf-8")), filename)}
+        response = client.post("/process_file", data=data, content_type="multipart/form-data")
+        return response.status_code == 200 and not response.get_json()["diagnosis"].startswith("Error:")
+
+    return {
+        "run_analysis": call_run_analysis,
+        "process_string": call_process_string,
+        "process_file": call_process_file,
+    }
+
+
+def run_target(call, reports, total_requests, concurrency):
+    """Sends `total_requests` reports (cycling through `reports`) with `concurrency` in flight."""
+    latencies, failures = [], 0
+    lock = threading.Lock()
+
+    def one(index):
+        nonlocal failures
+        filename, report = reports[index % len(reports)]
+        started = time.perf_counter()
+        try:
+            ok = call(filename, report)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    with ThreadSampler() as threads, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total_requests)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total_requests,
+        "failures": failures,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(total_requests / wall, 3) if wall else None,
+        "latency_seconds": summarize(latencies),
+        "peak_threads": threads.peak,
+    }
+
+
+def load_reports(paths):
+    from Batch import iter_reports
+    reports = [(os.path.basename(report_id), load()) for report_id, load in iter_reports(paths)]
+    if not reports:
+        raise SystemExit(f"No .txt reports found in: {', '.join(paths)}")
+    return reports
+
+
+def print_summary(results, baseline=None):
+    print(f"\nBenchmark @ {results['commit'] or 'unknown commit'} — backend {results['config']['backend']}, "
+          f"latency {results['config']['latency']}, concurrency {results['config']['concurrency']}")
+    print(f"{'target':<16}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'fail':>6}{'threads':>9}")
+    for name, target in results["targets"].items():
+        latency = target["latency_seconds"]
+        print(f"{name:<16}{target['throughput_rps']:>9.2f}{latency['p50']:>9.3f}{latency['p95']:>9.3f}"
+              f"{latency['p99']:>9.3f}{target['failures']:>6}{target['peak_threads']:>9}")
+        for role, timing in target["agent_seconds"].items():
+            print(f"  {role:<22} p50 {timing['p50']:.3f}s  p95 {timing['p95']:.3f}s  ({timing['count']} calls)")
+        previous = (baseline or {}).get("targets", {}).get(name)
+        if previous:
+            before, after = previous["throughput_rps"], target["throughput_rps"]
+            p95_before, p95_after = previous["latency_seconds"]["p95"], latency["p95"]
+            print(f"  vs {baseline.get('commit') or 'baseline'}: throughput {after - before:+.2f} req/s "
+                  f"({(after / before - 1) * 100 if before else 0:+.1f}%), p95 {p95_after - p95_before:+.3f}s")
+    print(f"Memory high-water mark: {results['max_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline with a fake (or real) model backend.")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_REPORTS_DIR], help="Report files, directories or .zip archives (default: the bundled sample reports)")
+    parser.add_argument("-n", "--requests", type=int, default=30, help="Requests sent to each target")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("-t", "--targets", default=",".join(TARGETS), help=f"Comma-separated subset of: {', '.join(TARGETS)}")
+    parser.add_argument("--backend", default="fake:bench", help="Model backend spec for every role (default: fake:bench)")
+    parser.add_argument("--latency", default="lognormal:0.2,0.5", help="Fake backend latency distribution (see Utils/FakeBackend.py)")
+    parser.add_argument("--seed", type=int, default=0, help="Fake backend random seed")
+    parser.add_argument("--cache", action="store_true", help="Keep the result caches on (off by default so every request reaches the model)")
+    parser.add_argument("--history", action="store_true", help="Keep the analysis history on (off by default so runs don't fill the database)")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the pipeline's own log output")
+    args = parser.parse_args()
+
+    targets = [name.strip() for name in args.targets.split(",") if name.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown target(s): {', '.join(sorted(unknown))}")
+
+    # Configure the pipeline before it is imported; these are read at import time
+    os.environ["MEDIAGENT_LLM_BACKEND"] = args.backend
+    os.environ["MEDIAGENT_FAKE_LATENCY"] = args.latency
+    os.environ["MEDIAGENT_FAKE_SEED"] = str(args.seed)
+    if not args.cache:
+        os.environ["MEDIAGENT_ANALYSIS_CACHE_BACKEND"] = "none"
+        os.environ["MEDIAGENT_AGENT_CACHE_BACKEND"] = "none"
+    os.environ["MEDIAGENT_HISTORY"] = "1" if args.history else "0"
+
+    sys.path.append(os.path.join(BASE_DIR, 'Utils'))
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        import app as app_module
+        from Agents import Agent
+    if app_module.api_key_missing():
+        print("GOOGLE_API_KEY is not set but the chosen backend needs it.")
+        return 1
+
+    reports = load_reports(args.paths)
+    callers = make_callers(app_module, app_module.app.test_client())
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {
+            "backend": args.backend,
+            "latency": args.latency,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "reports": len(reports),
+            "cache": args.cache,
+            "history": args.history,
+        },
+        "targets": {},
+    }
+
+    with AgentTimer(Agent) as agent_timer:
+        for name in targets:
+            print(f"⏱ Benchmarking {name}: {args.requests} requests, concurrency {args.concurrency}...")
+            agent_timer.reset()
+            with (contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())):
+                target = run_target(callers[name], reports, args.requests, args.concurrency)
+            target["agent_seconds"] = agent_timer.summary()
+            results["targets"][name] = target
+    results["max_rss_mb"] = max_rss_mb()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+    return 1 if any(target["failures"] for target in results["targets"].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
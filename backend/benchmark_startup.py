@@ -0,0 +1,258 @@
+"""
+Startup benchmark: how long a process takes to become ready to serve, and how
+much memory each serving worker costs.
+
+1. Cold start: runs the app in fresh interpreters and reports the time to
+   `import app`, the extra time preload() takes (model libraries and prompt
+   templates, which are otherwise imported on first use), the time until /ready
+   has warmed the model clients, and resident memory after each step.
+2. Served (needs gunicorn): starts `gunicorn -c gunicorn.conf.py wsgi:application`
+   with and without preload_app, times master start to the first ready answer,
+   and reports the memory of the master and each worker. On Linux the USS
+   (memory private to the process) and PSS (shared pages split between the
+   processes using them) show how much of the preloaded imports the workers share.
+
+Every role runs on the offline fake backend by default, so no API key is needed.
+
+Usage:
+    python benchmark_startup.py --runs 5 --workers 4
+    python benchmark_startup.py --output startup.json --baseline startup_main.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmark import git_commit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def memory_mb(pid="self"):
+    """{rss_mb, pss_mb, uss_mb} of a process from /proc (Linux); just rss_mb via ps elsewhere, or {}."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.rstrip().endswith("kB")}
+        return {
+            "rss_mb": round(fields["Rss"] / 1024, 1),
+            "pss_mb": round(fields["Pss"] / 1024, 1),
+            "uss_mb": round((fields["Private_Clean"] + fields["Private_Dirty"]) / 1024, 1),
+        }
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        target = str(os.getpid() if pid == "self" else pid)
+        rss_kb = int(subprocess.check_output(["ps", "-o", "rss=", "-p", target], text=True).strip())
+        return {"rss_mb": round(rss_kb / 1024, 1)}
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return {}
+
+
+def child_pids(pid):
+    """Direct children of a process (Linux /proc); [] where that isn't available."""
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def probe():
+    """Runs in a fresh interpreter: times each startup step and prints one JSON line."""
+    started = time.perf_counter()
+    sys.path.append(os.path.join(BASE_DIR, 'Utils'))
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+        imported = time.perf_counter()
+        after_import = memory_mb()
+        modules_after_import = len(sys.modules)
+        app.preload()
+        preloaded = time.perf_counter()
+        after_preload = memory_mb()
+        response = app.app.test_client().get("/ready")
+        ready = time.perf_counter()
+    print(json.dumps({
+        "import_seconds": imported - started,
+        "preload_seconds": preloaded - imported,
+        "ready_seconds": ready - preloaded,
+        "ready_status": response.status_code,
+        "modules_after_import": modules_after_import,
+        "modules_after_ready": len(sys.modules),
+        "rss_after_import_mb": after_import.get("rss_mb"),
+        "rss_after_preload_mb": after_preload.get("rss_mb"),
+        "rss_after_ready_mb": memory_mb().get("rss_mb"),
+    }))
+
+
+def run_cold_starts(runs, env):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, __file__, "--probe"], cwd=BASE_DIR, env=env, text=True)
+        sample = json.loads(output.strip().splitlines()[-1])
+        # Includes interpreter start-up, which the in-process timers can't see
+        sample["process_seconds"] = time.perf_counter() - started
+        samples.append(sample)
+
+    def median(key):
+        values = [s[key] for s in samples if s.get(key) is not None]
+        return round(statistics.median(values), 4) if values else None
+
+    return {
+        "runs": runs,
+        **{key: median(key) for key in (
+            "process_seconds", "import_seconds", "preload_seconds", "ready_seconds",
+            "rss_after_import_mb", "rss_after_preload_mb", "rss_after_ready_mb",
+            "modules_after_import", "modules_after_ready",
+        )},
+        "ready_ok": all(s["ready_status"] == 200 for s in samples),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_served(workers, preload, env, timeout=60):
+    """Starts gunicorn, waits for /ready and measures the master and workers; None without gunicorn."""
+    if shutil.which("gunicorn") is None:
+        return None
+    port = free_port()
+    env = {
+        **env,
+        "MEDIAGENT_BIND": f"127.0.0.1:{port}",
+        "MEDIAGENT_WORKERS": str(workers),
+        "MEDIAGENT_PRELOAD": "1" if preload else "0",
+        "MEDIAGENT_ACCESS_LOG": "",
+    }
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "wsgi:application"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first_ready = None
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5) as response:
+                    if response.status == 200:
+                        first_ready = time.perf_counter() - started
+                        break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.05)
+        if first_ready is None:
+            raise RuntimeError(f"no worker became ready within {timeout}s")
+
+        # Workers warm themselves before serving; wait for all of them to be up
+        while len(child_pids(server.pid)) < workers and time.perf_counter() - started < timeout:
+            time.sleep(0.05)
+        time.sleep(1.0)
+        worker_memory = [memory_mb(pid) for pid in child_pids(server.pid)]
+        return {
+            "workers": workers,
+            "preload": preload,
+            "seconds_to_first_ready": round(first_ready, 4),
+            "master": memory_mb(server.pid),
+            "workers_memory": worker_memory,
+            "total_pss_mb": round(sum(m.get("pss_mb", 0) for m in worker_memory + [memory_mb(server.pid)]), 1) or None,
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def mean(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def print_summary(results, baseline=None):
+    cold = results["cold_start"]
+    print(f"\nStartup @ {results['commit'] or 'unknown commit'} — backend {results['config']['backend']}")
+    print(f"Cold start (median of {cold['runs']}): process {cold['process_seconds']:.3f}s, "
+          f"import app {cold['import_seconds']:.3f}s, preload +{cold['preload_seconds']:.3f}s, "
+          f"/ready warm-up +{cold['ready_seconds']:.3f}s")
+    print(f"  RSS: {cold['rss_after_import_mb']} MB after import, {cold['rss_after_preload_mb']} MB after preload, "
+          f"{cold['rss_after_ready_mb']} MB when ready; {cold['modules_after_import']} modules at import")
+    previous = (baseline or {}).get("cold_start")
+    if previous:
+        print(f"  vs {baseline.get('commit') or 'baseline'}: import {cold['import_seconds'] - previous['import_seconds']:+.3f}s, "
+              f"process {cold['process_seconds'] - previous['process_seconds']:+.3f}s")
+    for served in results["served"]:
+        workers = served["workers_memory"]
+        print(f"gunicorn, {served['workers']} workers, preload {'on' if served['preload'] else 'off'}: "
+              f"first ready after {served['seconds_to_first_ready']:.3f}s; per worker RSS {mean(m.get('rss_mb') for m in workers)} MB, "
+              f"USS {mean(m.get('uss_mb') for m in workers)} MB, PSS {mean(m.get('pss_mb') for m in workers)} MB; "
+              f"total PSS {served['total_pss_mb']} MB")
+    if not results["served"]:
+        print("gunicorn is not installed; skipped the served measurements (pip install gunicorn)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time and per-worker memory.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time (the median is reported)")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="gunicorn workers for the served measurements")
+    parser.add_argument("--backend", default="fake:bench", help="Model backend spec for every role (default: fake:bench)")
+    parser.add_argument("--no-served", action="store_true", help="Skip the gunicorn measurements")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe()
+        return 0
+
+    env = {**os.environ, "MEDIAGENT_LLM_BACKEND": args.backend}
+    print(f"⏱ Timing {args.runs} cold starts...")
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {"backend": args.backend, "runs": args.runs, "workers": args.workers},
+        "cold_start": run_cold_starts(args.runs, env),
+        "served": [],
+    }
+    if not args.no_served:
+        for preload in (True, False):
+            print(f"⏱ Starting gunicorn with {args.workers} workers, preload {'on' if preload else 'off'}...")
+            served = run_served(args.workers, preload, env)
+            if served is None:
+                break
+            results["served"].append(served)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+    return 0 if results["cold_start"]["ready_ok"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for production serving:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Every value can be overridden with the MEDIAGENT_* variable next to it (or on
+the gunicorn command line). Limits in Utils/ such as MEDIAGENT_MAX_CONCURRENT_CALLS
+and the rate budget apply per worker process.
+"""
+import os
+
+bind = os.environ.get("MEDIAGENT_BIND", "0.0.0.0:5000")
+# Model calls are I/O-bound and run on each worker's event loop, so a few
+# processes with many threads go further than one process per core
+workers = int(os.environ.get("MEDIAGENT_WORKERS", 2))
+worker_class = os.environ.get("MEDIAGENT_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("MEDIAGENT_WORKER_THREADS", 16))
+# Import the app (and, via wsgi.py, the model libraries) once in the master and fork
+preload_app = os.environ.get("MEDIAGENT_PRELOAD", "1") == "1"
+# Longer than the slowest request (a queued /process_file waits up to MEDIAGENT_JOB_WAIT_SECONDS, 300s)
+timeout = int(os.environ.get("MEDIAGENT_WORKER_TIMEOUT", 330))
+graceful_timeout = int(os.environ.get("MEDIAGENT_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+accesslog = os.environ.get("MEDIAGENT_ACCESS_LOG", "-") or None
+
+
+def post_worker_init(worker):
+    """
+    Starts each worker's job queue threads, then warms its model clients before
+    it takes traffic (MEDIAGENT_WARM_WORKERS=0 leaves warming to /ready).
+    """
+    from app import api_key_missing, ensure_ready, job_queue
+    # Threads don't survive the fork from the master, so each worker starts its own
+    job_queue.start()
+    if os.environ.get("MEDIAGENT_WARM_WORKERS", "1") != "1":
+        return
+    if api_key_missing():
+        return
+    try:
+        ensure_ready()
+    except Exception as e:
+        worker.log.warning(f"Warm-up failed, /ready will retry: {e}")
@@ -8,17 +8,11 @@ ENV_PATH = os.path.join(BASE_DIR, '.env')
 print(f"Testing .env loading from: {ENV_PATH}")
 
 if os.path.exists(ENV_PATH):
-    # Handle BOM (Byte Order Mark) that Windows sometimes adds to UTF-8 files
+    # Same parser the app uses (Utils/Config.py); it handles the BOM Windows editors add
+    sys.path.append(os.path.join(BASE_DIR, 'Utils'))
+    from Config import parse_env_file
     try:
-        with open(ENV_PATH, 'r', encoding='utf-8-sig') as f:
-            # Read and parse manually to handle BOM
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip().strip('"').strip("'")  # Remove quotes
-                    os.environ[key] = value
+        os.environ.update(parse_env_file(ENV_PATH))
         print("✓ Loaded .env file (handled BOM)")
     except Exception as e:
         print(f"✗ Error loading .env: {e}")
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "Utils")]
+
+# Settings are read at import time, so they are fixed here before anything imports the app
+_DATA_DIR = tempfile.mkdtemp(prefix="mediagent-tests-")
+os.environ.update({
+    "MEDIAGENT_LLM_BACKEND": "fake",
+    "MEDIAGENT_HISTORY": "1",
+    "MEDIAGENT_HISTORY_TOKEN": "test-token",
+    "MEDIAGENT_HISTORY_PATH": os.path.join(_DATA_DIR, "history.sqlite3"),
+    "MEDIAGENT_JOB_QUEUE_PATH": os.path.join(_DATA_DIR, "jobs.sqlite3"),
+})
+
+SAMPLE_REPORTS_DIR = os.path.join(BACKEND_DIR, "Medical Reports")
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
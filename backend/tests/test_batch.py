@@ -0,0 +1,32 @@
+import io
+
+import pytest
+
+
+def _post(client, concurrency):
+    return client.post(
+        "/process_batch",
+        data={"files": (io.BytesIO(b"Chief Complaint:\nChest pain on exertion for two weeks.\n"), "report.txt"),
+              "concurrency": concurrency},
+        content_type="multipart/form-data",
+    )
+
+
+@pytest.mark.parametrize("concurrency", ["abc", "1.5", "0", "-3"])
+def test_bad_concurrency_is_400(client, concurrency):
+    assert _post(client, concurrency).status_code == 400
+
+
+def test_concurrency_is_clamped(client, app_module, monkeypatch):
+    seen = []
+
+    async def fake_analyze_reports(reports, analyze, concurrency=4, skip=()):
+        seen.append(concurrency)
+        return
+        yield
+
+    monkeypatch.setattr(app_module, "analyze_reports", fake_analyze_reports)
+    response = _post(client, "100000")
+    response.get_data()
+    assert response.status_code == 200
+    assert seen == [app_module.MAX_BATCH_CONCURRENCY]
@@ -0,0 +1,39 @@
+import asyncio
+
+from Hedging import HedgePolicy, hedged
+
+
+def _policy(delay):
+    policy = HedgePolicy(enabled=True, percentile=95, min_samples=5, max_extra_fraction=1.0)
+    for _ in range(5):
+        policy.histogram("Cardiologist").record(delay)
+    policy.counters["primary_calls"] = 10
+    return policy
+
+
+def test_hedge_win_records_the_primary_latency_so_far():
+    policy = _policy(0.05)
+    calls = []
+
+    async def call():
+        calls.append(None)
+        # The primary hangs; the hedge answers at once
+        await asyncio.sleep(10 if len(calls) == 1 else 0)
+        return "answer"
+
+    assert asyncio.run(hedged("Cardiologist", call, policy)) == "answer"
+    assert policy.counters["hedges_won"] == 1
+    # The window gained the primary's elapsed time (>= the hedge delay), not the hedge's ~0s
+    assert min(policy.histogram("Cardiologist")._samples) >= 0.05
+    assert policy.hedge_delay("Cardiologist") >= 0.05
+
+
+def test_primary_win_records_its_latency():
+    policy = _policy(0.01)
+
+    async def call():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    asyncio.run(hedged("Cardiologist", call, policy))
+    assert len(policy.histogram("Cardiologist")) == 6
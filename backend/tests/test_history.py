@@ -0,0 +1,37 @@
+import pytest
+
+AUTH = {"Authorization": "Bearer test-token"}
+ROUTES = [
+    ("get", "/history"),
+    ("get", "/history/unknown-id"),
+    ("post", "/history/unknown-id/reanalyze?dry_run=1"),
+    ("post", "/history/reanalyze"),
+]
+
+
+@pytest.mark.parametrize("method,path", ROUTES)
+def test_history_routes_require_token(client, method, path):
+    response = getattr(client, method)(path)
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("method,path", ROUTES)
+def test_history_routes_reject_wrong_token(client, method, path):
+    response = getattr(client, method)(path, headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+
+
+def test_history_readable_with_token(client, app_module):
+    analysis_id = app_module.history.record("Name: Jane Doe\nChest pain on exertion.", {}, "diagnosis")
+
+    listed = client.get("/history", headers=AUTH)
+    assert listed.status_code == 200
+    assert analysis_id in [item["id"] for item in listed.get_json()["items"]]
+
+    entry = client.get(f"/history/{analysis_id}", headers=AUTH)
+    assert entry.status_code == 200
+    assert entry.get_json()["patient_name"] == "Jane Doe"
+
+
+def test_other_routes_need_no_token(client):
+    assert client.get("/cache_stats").status_code == 200
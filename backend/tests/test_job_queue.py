@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from JobQueue import QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+
+def _queue_with_job(tmp_path):
+    """A queue (workers not started) holding one job claimed by this process."""
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), analyze=lambda report: "diagnosis")
+    queue.owner = "this-host:1:aaaa"
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, report_hash, report, status, created_at) VALUES ('job', 'hash', 'report', ?, ?)",
+            (QUEUED, time.time())
+        )
+    assert queue._claim() == ("job", "report")
+    return queue
+
+
+def test_finish_records_own_result(tmp_path):
+    queue = _queue_with_job(tmp_path)
+    queue._finish("job", result="diagnosis")
+    job = queue.get("job")
+    assert (job["status"], job["result"]) == (SUCCEEDED, "diagnosis")
+
+
+def test_finish_leaves_job_claimed_by_another_process(tmp_path):
+    queue = _queue_with_job(tmp_path)
+    # The heartbeat went stale, the job was requeued and another process claimed it
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET owner = 'other-host:2:bbbb' WHERE id = 'job'")
+
+    queue._finish("job", result="late diagnosis")
+
+    job = queue.get("job")
+    assert (job["status"], job["result"]) == (RUNNING, None)
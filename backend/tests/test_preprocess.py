@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from conftest import SAMPLE_REPORTS_DIR
+from Preprocess import report_for_role, split_sections
+from Registry import registry
+
+INSOMNIA = os.path.join(SAMPLE_REPORTS_DIR, "Medical Report - James Carter - Insomnia.txt")
+
+# For each enabled role: lines its routed prompt must contain, and lines it must not
+EXPECTED = {
+    "Cardiologist": (
+        ["Chief Complaint:", "Personal Medical History:", "Family History:", "Lifestyle Factors:",
+         "Medications:", "Sleep Study:", "Vital Signs:", "General Exam:"],
+        ["Name:", "Patient ID:"],
+    ),
+    "Psychologist": (
+        ["Chief Complaint:", "Family History:", "Lifestyle Factors:", "Medications:",
+         "Sleep Study:", "Blood Tests: Normal thyroid function", "Vital Signs:"],
+        ["Name:", "Patient ID:", "General Exam:"],
+    ),
+    "Pulmonologist": (
+        ["Chief Complaint:", "Personal Medical History:", "Lifestyle Factors:", "Medications:",
+         "Sleep Study:", "Vital Signs:", "General Exam:"],
+        ["Name:", "Patient ID:", "Family History:"],
+    ),
+}
+
+
+def test_every_enabled_role_is_covered():
+    assert set(registry.roles) == set(EXPECTED)
+
+
+@pytest.mark.parametrize("role", sorted(EXPECTED))
+def test_role_gets_a_subset_of_the_report(role):
+    with open(INSOMNIA, encoding="utf-8") as f:
+        report = f.read()
+    routed = report_for_role(split_sections(report), role, budget=0)
+    included, excluded = EXPECTED[role]
+
+    for line in included:
+        assert line in routed, f"{role} should see {line!r}"
+    for line in excluded:
+        assert line not in routed, f"{role} should not see {line!r}"
+    assert len(routed) < len(report)
@@ -0,0 +1,41 @@
+import os
+
+from AsyncRuntime import run_sync
+from conftest import SAMPLE_REPORTS_DIR
+
+REPORT = os.path.join(SAMPLE_REPORTS_DIR, "Medical Report - Robert Miller - COPD.txt")
+
+
+def _events(app_module, report):
+    async def collect():
+        return [event async for event in app_module.stream_analysis(report)]
+    return run_sync(collect())
+
+
+def _names(events):
+    names = [name for name, _ in events]
+    return [name for index, name in enumerate(names) if name != "synthesis" or names[index - 1] != "synthesis"]
+
+
+def _synthesis(events):
+    return "".join(data["text"] for name, data in events if name == "synthesis")
+
+
+def test_cache_hit_replays_the_same_events(app_module):
+    assert app_module.analysis_cache is not None
+    with open(REPORT, encoding="utf-8") as f:
+        report = f.read()
+
+    fresh = _events(app_module, report)
+    cached = _events(app_module, report)
+
+    # The synthesis streams in chunks on a fresh run and comes back as one on a hit
+    assert _names(cached) == _names(fresh)
+    assert _synthesis(cached) == _synthesis(fresh)
+    fresh_data, cached_data = dict(fresh), dict(cached)
+    assert cached_data["triage"] == fresh_data["triage"]
+    assert ([data for name, data in cached if name == "specialist"]
+            == [data for name, data in fresh if name == "specialist"])
+    assert cached_data["done"]["diagnosis"] == fresh_data["done"]["diagnosis"]
+    assert cached_data["done"]["preprocessing"] == fresh_data["done"]["preprocessing"]
+    assert cached_data["done"]["history_id"] not in (None, fresh_data["done"]["history_id"])
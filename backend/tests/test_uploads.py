@@ -0,0 +1,43 @@
+import io
+import os
+
+import pytest
+
+import Uploads
+from conftest import SAMPLE_REPORTS_DIR
+
+SAMPLE = os.path.join(SAMPLE_REPORTS_DIR, "Medical Report - Anna Thompson - Irritable Bowel Syndrome.txt")
+
+
+def test_cp1252_report_keeps_accented_names():
+    with open(SAMPLE, encoding="utf-8") as f:
+        report = f.read().replace("Anna Thompson", "José Müller-Ñúñez")
+    data = report.encode("cp1252", errors="replace")
+
+    text, encoding, size = Uploads.decode_text_stream(io.BytesIO(data))
+
+    assert encoding == "cp1252"
+    assert "José Müller-Ñúñez" in text
+    assert size == len(data)
+
+
+def test_utf8_report_is_read_as_utf8():
+    text, encoding, _ = Uploads.decode_text_stream(io.BytesIO("Name: José Müller\n".encode("utf-8")))
+    assert (encoding, text) == ("utf-8", "Name: José Müller\n")
+
+
+def test_extraction_process_that_cannot_start_is_503(monkeypatch):
+    class BrokenContext:
+        Pipe = Uploads.multiprocessing.Pipe
+
+        class Process:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def start(self):
+                raise RuntimeError("An attempt has been made to start a new process before bootstrapping")
+
+    monkeypatch.setattr(Uploads, "_get_context", lambda: BrokenContext)
+    with pytest.raises(Uploads.UploadError) as error:
+        Uploads._run_extraction("pdf", "missing.pdf")
+    assert error.value.status_code == 503
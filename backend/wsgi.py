@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production serving.
+
+Run with:
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Importing this module imports the app and preloads the model libraries and
+prompt templates. With preload_app (the default in gunicorn.conf.py) that
+happens once in the gunicorn master, and the forked workers share those pages
+copy-on-write instead of each importing LangChain on its first request. Model
+clients, the async bridge loop and job workers are still created per worker.
+"""
+from app import app as application, preload
+
+preload()
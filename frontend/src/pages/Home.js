@@ -1,18 +1,37 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { processMedicalFile } from '../services/api';
+import { extractReportText, listHistory } from '../services/api';
+
+const ACCEPTED_EXTENSIONS = ['.txt', '.pdf', '.docx'];
 
 function Home() {
   const [file, setFile] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  const [recent, setRecent] = useState([]);
   const navigate = useNavigate();
 
+  useEffect(() => {
+    // Recent analyses are optional: the list simply stays hidden if history is off
+    listHistory({ per_page: 5 })
+      .then((data) => setRecent(data.items))
+      .catch(() => setRecent([]));
+  }, []);
+
+  const openAnalysis = (item) => {
+    sessionStorage.removeItem('diagnosis');
+    sessionStorage.removeItem('reportContent');
+    sessionStorage.setItem('historyId', item.id);
+    sessionStorage.setItem('filename', item.patient_name || item.id);
+    navigate('/results');
+  };
+
   const handleFileChange = (e) => {
     const selectedFile = e.target.files[0];
     if (selectedFile) {
-      if (!selectedFile.name.toLowerCase().endsWith('.txt')) {
-        setError('Please select a .txt file');
+      const name = selectedFile.name.toLowerCase();
+      if (!ACCEPTED_EXTENSIONS.some((ext) => name.endsWith(ext))) {
+        setError('Please select a .txt, .pdf or .docx file');
         setFile(null);
         return;
       }
@@ -33,18 +52,16 @@ function Home() {
     setError('');
 
     try {
-      const response = await processMedicalFile(file);
-      
-      if (response.status === 'success') {
-        // Store the diagnosis in sessionStorage to pass to results page
-        sessionStorage.setItem('diagnosis', response.diagnosis);
-        sessionStorage.setItem('filename', response.filename_processed || file.name);
-        navigate('/results');
-      } else {
-        setError('Failed to process file. Please try again.');
-      }
+      // Results streams the analysis itself, so hand it the report text;
+      // the server decodes text files and extracts PDF/DOCX text
+      const { report_content: reportContent } = await extractReportText(file);
+      sessionStorage.removeItem('diagnosis');
+      sessionStorage.removeItem('historyId');
+      sessionStorage.setItem('reportContent', reportContent);
+      sessionStorage.setItem('filename', file.name);
+      navigate('/results');
     } catch (err) {
-      setError(err.message || 'An error occurred while processing the file. Please try again.');
+      setError(err.message || 'An error occurred while reading the file. Please try again.');
     } finally {
       setLoading(false);
     }
@@ -72,7 +89,7 @@ function Home() {
             {/* File Input */}
             <div>
               <label className="block text-sm font-medium text-gray-700 mb-2">
-                Upload Medical Report (.txt file)
+                Upload Medical Report (.txt, .pdf or .docx)
               </label>
               <div className="mt-1 flex justify-center px-6 pt-5 pb-6 border-2 border-gray-300 border-dashed rounded-lg hover:border-primary-500 transition-colors">
                 <div className="space-y-1 text-center">
@@ -101,14 +118,14 @@ function Home() {
                         name="file-upload"
                         type="file"
                         className="sr-only"
-                        accept=".txt"
+                        accept=".txt,.pdf,.docx"
                         onChange={handleFileChange}
                         disabled={loading}
                       />
                     </label>
                     <p className="pl-1">or drag and drop</p>
                   </div>
-                  <p className="text-xs text-gray-500">TXT files only</p>
+                  <p className="text-xs text-gray-500">TXT, PDF or DOCX</p>
                   {file && (
                     <p className="mt-2 text-sm text-gray-900 font-medium">
                       Selected: {file.name}
@@ -169,7 +186,7 @@ function Home() {
             <ul className="space-y-2 text-sm text-gray-600">
               <li className="flex items-start">
                 <span className="text-primary-600 mr-2">•</span>
-                <span>Upload your medical report in .txt format</span>
+                <span>Upload your medical report as a .txt, .pdf or .docx file</span>
               </li>
               <li className="flex items-start">
                 <span className="text-primary-600 mr-2">•</span>
@@ -185,6 +202,31 @@ function Home() {
               </li>
             </ul>
           </div>
+
+          {/* Recent Analyses */}
+          {recent.length > 0 && (
+            <div className="mt-8 pt-6 border-t border-gray-200">
+              <h3 className="text-sm font-medium text-gray-900 mb-3">
+                Recent analyses:
+              </h3>
+              <ul className="space-y-2 text-sm">
+                {recent.map((item) => (
+                  <li key={item.id}>
+                    <button
+                      type="button"
+                      onClick={() => openAnalysis(item)}
+                      className="w-full flex justify-between text-left text-primary-600 hover:text-primary-700"
+                    >
+                      <span>{item.patient_name || 'Unnamed patient'}</span>
+                      <span className="text-gray-500">
+                        {new Date(item.created_at * 1000).toLocaleString()}
+                      </span>
+                    </button>
+                  </li>
+                ))}
+              </ul>
+            </div>
+          )}
         </div>
       </div>
     </div>
@@ -1,35 +1,216 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import ReactMarkdown from 'react-markdown';
+import { getHistoryEntry, streamMedicalAnalysis } from '../services/api';
+
+const markdownComponents = {
+  // Custom styling for markdown elements
+  h1: ({ node, ...props }) => (
+    <h1 className="text-3xl font-bold text-gray-900 mt-8 mb-4" {...props} />
+  ),
+  h2: ({ node, ...props }) => (
+    <h2 className="text-2xl font-semibold text-gray-800 mt-6 mb-3" {...props} />
+  ),
+  h3: ({ node, ...props }) => (
+    <h3 className="text-xl font-semibold text-gray-700 mt-4 mb-2" {...props} />
+  ),
+  p: ({ node, ...props }) => (
+    <p className="text-gray-700 mb-4 leading-relaxed" {...props} />
+  ),
+  ul: ({ node, ...props }) => (
+    <ul className="list-disc list-inside mb-4 space-y-2 text-gray-700" {...props} />
+  ),
+  ol: ({ node, ...props }) => (
+    <ol className="list-decimal list-inside mb-4 space-y-2 text-gray-700" {...props} />
+  ),
+  li: ({ node, ...props }) => (
+    <li className="ml-4 text-gray-700" {...props} />
+  ),
+  strong: ({ node, ...props }) => (
+    <strong className="font-semibold text-gray-900" {...props} />
+  ),
+  em: ({ node, ...props }) => (
+    <em className="italic text-gray-700" {...props} />
+  ),
+  code: ({ node, ...props }) => (
+    <code className="bg-gray-100 px-2 py-1 rounded text-sm font-mono text-gray-800" {...props} />
+  ),
+  blockquote: ({ node, ...props }) => (
+    <blockquote className="border-l-4 border-primary-500 pl-4 italic text-gray-600 my-4" {...props} />
+  ),
+};
+
+const LIKELIHOOD_STYLES = {
+  high: 'bg-red-100 text-red-800',
+  moderate: 'bg-yellow-100 text-yellow-800',
+  low: 'bg-gray-100 text-gray-700',
+};
+
+// A structured-mode answer ({findings, next_steps}) kept as text, e.g. in sessionStorage
+const parseAssessment = (text) => {
+  try {
+    const value = JSON.parse(text);
+    return value && Array.isArray(value.findings) ? value : null;
+  } catch (err) {
+    return null;
+  }
+};
+
+// Renders a structured-mode answer: ranked findings with their likelihood, then next steps
+function Assessment({ assessment, compact = false }) {
+  return (
+    <div className={compact ? 'text-sm' : ''}>
+      <ul className="space-y-3 mb-4">
+        {assessment.findings.map((finding, index) => (
+          <li key={index}>
+            <div className="flex items-center flex-wrap gap-2">
+              <span className="font-semibold text-gray-900">{finding.condition}</span>
+              <span className={`px-2 py-0.5 rounded-full text-xs font-medium ${LIKELIHOOD_STYLES[finding.likelihood] || LIKELIHOOD_STYLES.low}`}>
+                {finding.likelihood}
+              </span>
+            </div>
+            {finding.evidence && <p className="text-gray-700 mt-1">{finding.evidence}</p>}
+            {finding.specialists && finding.specialists.length > 0 && (
+              <p className="text-xs text-gray-500 mt-1">Supported by: {finding.specialists.join(', ')}</p>
+            )}
+          </li>
+        ))}
+      </ul>
+      {assessment.next_steps.length > 0 && (
+        <>
+          <h4 className="font-semibold text-gray-900 mb-2">Next steps</h4>
+          <ul className="list-disc list-inside space-y-1 text-gray-700">
+            {assessment.next_steps.map((step, index) => (
+              <li key={index}>{step}</li>
+            ))}
+          </ul>
+        </>
+      )}
+    </div>
+  );
+}
 
 function Results() {
   const [diagnosis, setDiagnosis] = useState('');
   const [filename, setFilename] = useState('');
+  const [specialistReports, setSpecialistReports] = useState({});
+  // Parsed answers, present when the backend runs in structured mode
+  const [specialistAssessments, setSpecialistAssessments] = useState({});
+  const [diagnosisAssessment, setDiagnosisAssessment] = useState(null);
+  // Roles come from the backend's specialist registry via the 'triage' event
+  const [specialistRoles, setSpecialistRoles] = useState([]);
+  const [skippedSpecialists, setSkippedSpecialists] = useState([]);
+  const [streaming, setStreaming] = useState(false);
+  const [error, setError] = useState('');
   const navigate = useNavigate();
 
   useEffect(() => {
-    // Retrieve diagnosis from sessionStorage
+    // Retrieve diagnosis (or the report still to analyze) from sessionStorage
     const storedDiagnosis = sessionStorage.getItem('diagnosis');
+    const storedReport = sessionStorage.getItem('reportContent');
     const storedFilename = sessionStorage.getItem('filename');
+    const storedHistoryId = sessionStorage.getItem('historyId');
+    setFilename(storedFilename || 'Unknown');
 
-    if (!storedDiagnosis) {
-      // If no diagnosis found, redirect to home
+    if (storedHistoryId && !storedReport) {
+      // A stored analysis: show its specialists and diagnosis without re-running anything
+      let cancelled = false;
+      getHistoryEntry(storedHistoryId)
+        .then((entry) => {
+          if (cancelled) return;
+          const reports = {};
+          const assessments = {};
+          entry.specialists.forEach((row) => {
+            reports[row.role] = row.output || `Analysis failed: ${row.error}`;
+            if (row.structured) assessments[row.role] = row.structured;
+          });
+          setSpecialistRoles(entry.consulted);
+          setSpecialistReports(reports);
+          setSpecialistAssessments(assessments);
+          setDiagnosis(entry.diagnosis || '');
+          setDiagnosisAssessment(entry.structured);
+          if (entry.error) setError(entry.error);
+        })
+        .catch((err) => {
+          if (!cancelled) setError(err.message || 'Could not load the stored analysis.');
+        });
+      return () => {
+        cancelled = true;
+      };
+    }
+
+    if (storedDiagnosis) {
+      setDiagnosis(storedDiagnosis);
+      setDiagnosisAssessment(parseAssessment(storedDiagnosis));
+      return;
+    }
+
+    if (!storedReport) {
+      // If nothing to show or analyze, redirect to home
       navigate('/');
       return;
     }
 
-    setDiagnosis(storedDiagnosis);
-    setFilename(storedFilename || 'Unknown');
+    // Render each specialist as soon as it finishes, then the synthesis as it streams
+    const controller = new AbortController();
+    setStreaming(true);
+    setDiagnosis('');
+    setSpecialistReports({});
+    setSpecialistAssessments({});
+    setDiagnosisAssessment(null);
+    setSpecialistRoles([]);
+    setSkippedSpecialists([]);
+    setError('');
+
+    streamMedicalAnalysis(
+      storedReport,
+      (event, data) => {
+        if (event === 'triage') {
+          setSpecialistRoles([...(data.selected || []), ...(data.skipped || [])]);
+          setSkippedSpecialists(data.skipped || []);
+        } else if (event === 'specialist') {
+          setSpecialistReports((prev) => ({ ...prev, [data.role]: data.report }));
+          if (data.structured) {
+            setSpecialistAssessments((prev) => ({ ...prev, [data.role]: data.structured }));
+          }
+        } else if (event === 'synthesis') {
+          setDiagnosis((prev) => prev + data.text);
+        } else if (event === 'done') {
+          setDiagnosis(data.diagnosis);
+          setDiagnosisAssessment(data.structured || null);
+          sessionStorage.setItem('diagnosis', data.diagnosis);
+          sessionStorage.removeItem('reportContent');
+          if (data.history_id) sessionStorage.setItem('historyId', data.history_id);
+        } else if (event === 'error') {
+          setError(data.error || 'Analysis failed. Please try again.');
+        }
+      },
+      controller.signal
+    )
+      .catch((err) => {
+        if (err.name !== 'AbortError') {
+          setError(err.message || 'An error occurred while processing the report.');
+        }
+      })
+      .finally(() => {
+        if (!controller.signal.aborted) setStreaming(false);
+      });
+
+    return () => controller.abort();
   }, [navigate]);
 
   const handleGoHome = () => {
     // Clear session storage
     sessionStorage.removeItem('diagnosis');
+    sessionStorage.removeItem('reportContent');
     sessionStorage.removeItem('filename');
+    sessionStorage.removeItem('historyId');
     navigate('/');
   };
 
-  if (!diagnosis) {
+  const hasSpecialists = Object.keys(specialistReports).length > 0;
+
+  if (!diagnosis && !streaming && !error) {
     return (
       <div className="min-h-screen flex items-center justify-center">
         <div className="text-center">
@@ -63,6 +244,42 @@ function Results() {
           </div>
         </div>
 
+        {/* Error Message */}
+        {error && (
+          <div className="bg-red-50 border border-red-200 text-red-700 px-4 py-3 rounded-lg mb-6">
+            {error}
+          </div>
+        )}
+
+        {/* Specialist Cards (filled in as each agent finishes) */}
+        {(streaming || hasSpecialists) && (
+          <div className="grid gap-4 md:grid-cols-3 mb-6">
+            {specialistRoles.map((role) => (
+              <div key={role} className="bg-white rounded-2xl shadow-xl p-6">
+                <h3 className="text-lg font-semibold text-gray-900 mb-3">{role}</h3>
+                {skippedSpecialists.includes(role) ? (
+                  <p className="text-sm text-gray-500">Not consulted for this report.</p>
+                ) : specialistAssessments[role] ? (
+                  <div className="max-h-64 overflow-y-auto">
+                    <Assessment assessment={specialistAssessments[role]} compact />
+                  </div>
+                ) : specialistReports[role] ? (
+                  <div className="markdown-content text-sm max-h-64 overflow-y-auto">
+                    <ReactMarkdown components={markdownComponents}>
+                      {specialistReports[role]}
+                    </ReactMarkdown>
+                  </div>
+                ) : (
+                  <div className="flex items-center text-sm text-gray-500">
+                    <div className="animate-spin rounded-full h-4 w-4 border-b-2 border-primary-600 mr-2"></div>
+                    Analyzing...
+                  </div>
+                )}
+              </div>
+            ))}
+          </div>
+        )}
+
         {/* Results Card */}
         <div className="bg-white rounded-2xl shadow-xl p-8">
           <div className="mb-6">
@@ -72,51 +289,28 @@ function Results() {
             <div className="h-1 w-24 bg-primary-600 rounded"></div>
           </div>
 
-          {/* Markdown Content */}
-          <div className="prose prose-lg max-w-none">
-            <div className="markdown-content">
-              <ReactMarkdown
-                components={{
-                  // Custom styling for markdown elements
-                  h1: ({ node, ...props }) => (
-                    <h1 className="text-3xl font-bold text-gray-900 mt-8 mb-4" {...props} />
-                  ),
-                  h2: ({ node, ...props }) => (
-                    <h2 className="text-2xl font-semibold text-gray-800 mt-6 mb-3" {...props} />
-                  ),
-                  h3: ({ node, ...props }) => (
-                    <h3 className="text-xl font-semibold text-gray-700 mt-4 mb-2" {...props} />
-                  ),
-                  p: ({ node, ...props }) => (
-                    <p className="text-gray-700 mb-4 leading-relaxed" {...props} />
-                  ),
-                  ul: ({ node, ...props }) => (
-                    <ul className="list-disc list-inside mb-4 space-y-2 text-gray-700" {...props} />
-                  ),
-                  ol: ({ node, ...props }) => (
-                    <ol className="list-decimal list-inside mb-4 space-y-2 text-gray-700" {...props} />
-                  ),
-                  li: ({ node, ...props }) => (
-                    <li className="ml-4 text-gray-700" {...props} />
-                  ),
-                  strong: ({ node, ...props }) => (
-                    <strong className="font-semibold text-gray-900" {...props} />
-                  ),
-                  em: ({ node, ...props }) => (
-                    <em className="italic text-gray-700" {...props} />
-                  ),
-                  code: ({ node, ...props }) => (
-                    <code className="bg-gray-100 px-2 py-1 rounded text-sm font-mono text-gray-800" {...props} />
-                  ),
-                  blockquote: ({ node, ...props }) => (
-                    <blockquote className="border-l-4 border-primary-500 pl-4 italic text-gray-600 my-4" {...props} />
-                  ),
-                }}
-              >
-                {diagnosis}
-              </ReactMarkdown>
+          {/* Waiting for the specialists before the synthesis starts */}
+          {streaming && !diagnosis && (
+            <div className="flex items-center text-gray-600">
+              <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-primary-600 mr-3"></div>
+              Waiting for the specialist reports...
             </div>
-          </div>
+          )}
+
+          {/* Structured findings, or the Markdown diagnosis */}
+          {diagnosisAssessment ? (
+            <Assessment assessment={diagnosisAssessment} />
+          ) : (
+            <div className="prose prose-lg max-w-none">
+              <div className="markdown-content">
+                <ReactMarkdown
+                  components={markdownComponents}
+                >
+                  {diagnosis}
+                </ReactMarkdown>
+              </div>
+            </div>
+          )}
 
           {/* Footer Note */}
           <div className="mt-8 pt-6 border-t border-gray-200">
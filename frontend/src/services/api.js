@@ -1,9 +1,13 @@
 // API configuration
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+// Bearer token for the /history routes (the backend's MEDIAGENT_HISTORY_TOKEN)
+const HISTORY_HEADERS = process.env.REACT_APP_HISTORY_TOKEN
+  ? { Authorization: `Bearer ${process.env.REACT_APP_HISTORY_TOKEN}` }
+  : {};
 
 /**
  * Uploads a medical report file and processes it
- * @param {File} file - The .txt file to upload
+ * @param {File} file - The .txt, .pdf or .docx file to upload
  * @returns {Promise<Object>} Response containing diagnosis
  */
 export const processMedicalFile = async (file) => {
@@ -29,6 +33,34 @@ export const processMedicalFile = async (file) => {
   }
 };
 
+/**
+ * Extracts the text of a report file (.txt in any common encoding, .pdf or .docx)
+ * on the server without analyzing it
+ * @param {File} file - The report file to upload
+ * @returns {Promise<Object>} Response containing report_content, filename, kind and bytes
+ */
+export const extractReportText = async (file) => {
+  const formData = new FormData();
+  formData.append('file', file);
+
+  try {
+    const response = await fetch(`${API_BASE_URL}/extract_text`, {
+      method: 'POST',
+      body: formData,
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || 'Failed to read file');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error extracting report text:', error);
+    throw error;
+  }
+};
+
 /**
  * Processes a medical report string
  * @param {string} reportContent - The medical report content as string
@@ -57,3 +89,129 @@ export const processMedicalString = async (reportContent) => {
   }
 };
 
+
+/**
+ * Streams a medical report analysis from /process_stream (Server-Sent Events).
+ * Events: 'specialist' ({role, report}), 'synthesis' ({text} chunk),
+ * 'done' ({diagnosis, history_id}) and 'error' ({error}). In structured mode
+ * 'specialist' and 'done' also carry the parsed answer as `structured` and no
+ * 'synthesis' chunks are sent.
+ * @param {string} reportContent - The medical report content as string
+ * @param {Function} onEvent - Called as onEvent(eventName, data) for each event
+ * @param {AbortSignal} [signal] - Optional signal to cancel the stream
+ * @returns {Promise<void>} Resolves when the stream ends
+ */
+export const streamMedicalAnalysis = async (reportContent, onEvent, signal) => {
+  const response = await fetch(`${API_BASE_URL}/process_stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    },
+    body: JSON.stringify({ report_content: reportContent }),
+    signal,
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.error || 'Failed to process report');
+  }
+
+  // EventSource can't POST, so parse the SSE frames from the body ourselves
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let eventName = 'message';
+      let data = '';
+      frame.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (data) onEvent(eventName, JSON.parse(data));
+    }
+  }
+};
+
+/**
+ * Lists stored analyses, newest first
+ * @param {Object} [params] - page, per_page, patient (start of the name), since, until
+ * @returns {Promise<Object>} Response containing items, page, per_page and total
+ */
+export const listHistory = async (params = {}) => {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, value]) => value !== undefined && value !== '')
+  );
+
+  try {
+    const response = await fetch(`${API_BASE_URL}/history?${query}`, { headers: HISTORY_HEADERS });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || 'Failed to load history');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error loading history:', error);
+    throw error;
+  }
+};
+
+/**
+ * Fetches one stored analysis with its report, specialist outputs and diagnosis
+ * @param {string} analysisId - The history id (from listHistory or the stream's 'done' event)
+ * @returns {Promise<Object>} The stored analysis
+ */
+export const getHistoryEntry = async (analysisId) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/history/${encodeURIComponent(analysisId)}`, {
+      headers: HISTORY_HEADERS,
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || 'Failed to load analysis');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error loading analysis:', error);
+    throw error;
+  }
+};
+
+/**
+ * Re-runs only the parts of a stored analysis whose prompt template or model changed
+ * @param {string} analysisId - The history id
+ * @param {boolean} [dryRun] - Only report what would be recomputed
+ * @returns {Promise<Object>} Summary with status, recomputed and reused roles
+ */
+export const reanalyzeHistoryEntry = async (analysisId, dryRun = false) => {
+  try {
+    const response = await fetch(
+      `${API_BASE_URL}/history/${encodeURIComponent(analysisId)}/reanalyze${dryRun ? '?dry_run=1' : ''}`,
+      { method: 'POST', headers: HISTORY_HEADERS }
+    );
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || 'Failed to re-analyze');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error re-analyzing:', error);
+    throw error;
+  }
+};